@@ -1,8 +1,16 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
+from . import player_cache
+from .histogram import record_score_change
 from .models import (
+    ArchivedPlayer,
     Equipment,
     Harvest,
+    Job,
     Minigame,
     Player,
     PlayerEquipment,
@@ -11,6 +19,29 @@ from .models import (
 )
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Для таблицы без фильтров в PostgreSQL берёт оценку количества строк из
+    статистики планировщика (pg_class.reltuples) вместо точного COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+
+        return super().count
+
+
 class EquipmentAdmin(admin.ModelAdmin):
     list_display = (
         "id",
@@ -24,6 +55,7 @@ class HarvestAdmin(admin.ModelAdmin):
         "id",
         "name",
         "description",
+        "growth_rate",
     )
 
 
@@ -42,6 +74,9 @@ class EquipmentInline(admin.TabularInline):
     readonly = True
     fieldsets = ((None, {"fields": (("equipment_name", "available"),)}),)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("equipment")
+
 
 class HarvestInline(admin.TabularInline):
     model = PlayerHarvest
@@ -51,7 +86,13 @@ class HarvestInline(admin.TabularInline):
         "harvest",
         "available",
         "gen_modified",
+        "growth_rate",
     )
+    # Справочник не выводится выпадающим списком в каждой строке
+    readonly_fields = ("harvest",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("harvest")
 
 
 class MinigameInline(admin.TabularInline):
@@ -59,6 +100,10 @@ class MinigameInline(admin.TabularInline):
     extra = 0
     readonly = True
     fields = ("minigame", "available", "complete", "score", "achievement")
+    readonly_fields = ("minigame",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("minigame")
 
 
 @admin.register(Player)
@@ -67,11 +112,111 @@ class PlayerAdmin(admin.ModelAdmin):
     inlines = [EquipmentInline, MinigameInline]
     save_on_top = True
     save_as = True
+    search_fields = ("name",)
+    search_help_text = "Поиск по началу имени игрока"
+    # Сортировка только по индексированным полям
+    ordering = ("-id",)
+    sortable_by = ("name", "id")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {"fields": (("name", "gender"),)}),
         (None, {"fields": (("own_money", "own_coins", "top_score", "user_review"),)}),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.name_prefix(search_term), False
+
+    def save_model(self, request, obj, form, change):
+        # Изменение top_score вручную переносит игрока в гистограмме счёта,
+        # новых игроков учитывает сигнал post_save
+        if change and "top_score" in form.changed_data:
+            old_top_score = (
+                Player.objects.select_for_update()
+                .values_list("top_score", flat=True)
+                .get(pk=obj.pk)
+            )
+            super().save_model(request, obj, form, change)
+            record_score_change(old_top_score, obj.top_score)
+        else:
+            super().save_model(request, obj, form, change)
+
+    # Кэш документа обновляется после сохранения встроенных форм,
+    # когда изменения игрока записаны полностью
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Достижения могли измениться во встроенной форме мини-игр
+        form.instance.refresh_achievements()
+        Player.objects.filter(pk=form.instance.pk).bump_versions(*Player.SYNC_SECTIONS)
+        player_cache.refresh_player(form.instance.pk)
+
+    def delete_model(self, request, obj):
+        player_id = obj.pk
+        super().delete_model(request, obj)
+        player_cache.invalidate_players([player_id])
+
+    def delete_queryset(self, request, queryset):
+        player_ids = list(queryset.values_list("id", flat=True))
+        super().delete_queryset(request, queryset)
+        player_cache.invalidate_players(player_ids)
+
+
+@admin.register(ArchivedPlayer)
+class ArchivedPlayerAdmin(admin.ModelAdmin):
+    list_display = ("name", "id", "top_score", "last_active", "archived_at")
+    search_fields = ("name",)
+    search_help_text = "Поиск по началу имени игрока"
+    ordering = ("-id",)
+    sortable_by = ("name", "id")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = (
+        "id",
+        "name",
+        "top_score",
+        "user_review",
+        "document",
+        "last_active",
+        "archived_at",
+    )
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(name__startswith=search_term), False
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "name",
+        "key",
+        "status",
+        "attempts",
+        "progress",
+        "total",
+        "duration",
+        "created_at",
+    )
+    list_filter = ("status", "name")
+    ordering = ("-id",)
+    readonly_fields = (
+        "created_at",
+        "started_at",
+        "locked_until",
+        "locked_by",
+        "finished_at",
+        "duration",
+    )
+
 
 admin.site.register(Equipment, EquipmentAdmin)
 admin.site.register(Harvest, HarvestAdmin)
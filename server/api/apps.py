@@ -7,3 +7,6 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals
+        from api.shared_state import check_shared_state
+
+        check_shared_state()
@@ -0,0 +1,171 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import metrics, minigame_leaderboard
+from .backfill import THROUGH_MODELS
+from .bulk import bulk_create_players, player_document, player_documents_queryset
+from .histogram import record_score_changes
+from .models import ArchivedPlayer, Minigame, Player
+from .player_cache import invalidate_players
+
+# Размер таблицы лидеров: её игроки не архивируются
+LEADERBOARD_SIZE = 100
+
+
+def activity_key(player_id):
+    return f"player-active:{player_id}"
+
+
+def touch_player(player_id):
+    """
+    Отмечает обращение игрока. В БД время пишется не чаще раза в
+    PLAYER_ACTIVITY_INTERVAL секунд, остальные вызовы обходятся кэшем.
+    """
+    if cache.add(activity_key(player_id), True, settings.PLAYER_ACTIVITY_INTERVAL):
+        Player.objects.filter(pk=player_id).update(last_active=timezone.now())
+
+
+def archive_candidates(inactive_days):
+    """
+    Игроки без обращений за inactive_days дней, кроме участников общей
+    таблицы лидеров и таблиц лидеров мини-игр: они строятся только по
+    активным игрокам.
+    """
+    cutoff = timezone.now() - timedelta(days=inactive_days)
+    candidates = Player.objects.filter(last_active__lt=cutoff)
+
+    lowest_leader = (
+        Player.objects.filter(top_score__gt=0)
+        .order_by("-top_score")
+        .values_list("top_score", flat=True)[LEADERBOARD_SIZE - 1 : LEADERBOARD_SIZE]
+    )
+    if lowest_leader:
+        candidates = candidates.filter(top_score__lt=lowest_leader[0])
+    else:
+        candidates = candidates.filter(top_score__lte=0)
+
+    # Не больше LEADERBOARD_SIZE игроков на каждую мини-игру
+    leaders = {
+        player_id
+        for minigame_id in Minigame.objects.values_list("id", flat=True)
+        for player_id in minigame_leaderboard.top_scores(minigame_id).values_list(
+            "player_id", flat=True
+        )
+    }
+    return candidates.exclude(id__in=leaders)
+
+
+def archive_players(inactive_days, batch_size=1000, progress=None):
+    """
+    Переносит неактивных игроков в ArchivedPlayer пачками по batch_size,
+    каждая пачка - в отдельной транзакции. progress(archived) вызывается
+    после каждой пачки. Возвращает количество перенесённых игроков.
+    """
+    archived = 0
+    last_id = 0
+    while True:
+        candidates = archive_candidates(inactive_days)
+        ids = list(
+            candidates.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return archived
+
+        last_id = ids[-1]
+        archived += _archive_chunk(candidates.filter(id__in=ids))
+        if progress is not None:
+            progress(archived)
+
+
+def _archive_chunk(candidates):
+    with transaction.atomic():
+        # Условие отбора проверяется повторно под блокировкой: игрок мог
+        # вернуться после выборки
+        ids = list(candidates.select_for_update().values_list("id", flat=True))
+        players = list(player_documents_queryset().filter(id__in=ids))
+        if not players:
+            return 0
+
+        ArchivedPlayer.objects.bulk_create(
+            [
+                ArchivedPlayer(
+                    id=player.id,
+                    name=player.name,
+                    top_score=player.top_score,
+                    user_review=player.user_review,
+                    document=player_document(player),
+                    last_active=player.last_active,
+                )
+                for player in players
+            ]
+        )
+
+        for model, _, _ in THROUGH_MODELS:
+            model.objects.filter(player_id__in=ids).delete()
+        # Без сигналов post_delete: гистограмма обновляется одним вызовом ниже
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(Player._meta.db_table)} "
+                f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+
+        record_score_changes((player.top_score, None) for player in players)
+        invalidate_players(ids)
+
+    metrics.increment("archive.archived", len(players))
+    return len(players)
+
+
+def restore_players(player_ids):
+    """
+    Возвращает игроков из архива в рабочие таблицы с прежними id и
+    версиями. Элементы справочников, добавленные после архивации, получают
+    значения по умолчанию. Возвращает список восстановленных id.
+    """
+    with transaction.atomic():
+        # Запрос может читать с реплик, но архив проверяется на основной БД
+        archived = list(
+            ArchivedPlayer.objects.using(DEFAULT_DB_ALIAS)
+            .select_for_update()
+            .filter(id__in=player_ids)
+        )
+        if not archived:
+            return []
+
+        now = timezone.now()
+        bulk_create_players(
+            [{**player.document, "last_active": now} for player in archived],
+            keep_ids=True,
+        )
+        ids = [player.id for player in archived]
+        ArchivedPlayer.objects.filter(id__in=ids).delete()
+
+    metrics.increment("archive.restored", len(ids))
+    return ids
+
+
+def player_statistics():
+    """
+    Количество игроков, количество оценок и средняя оценка по активным и
+    архивным игрокам вместе.
+    """
+    total = reviews = review_sum = 0
+    for model in (Player, ArchivedPlayer):
+        values = model.objects.aggregate(
+            total=Count("id"),
+            reviews=Count("user_review"),
+            review_sum=Sum("user_review"),
+        )
+        total += values["total"]
+        reviews += values["reviews"]
+        review_sum += values["review_sum"] or 0
+
+    return total, reviews, review_sum / reviews if reviews else None
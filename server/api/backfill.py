@@ -0,0 +1,154 @@
+import time
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from .models import Player, PlayerEquipment, PlayerHarvest, PlayerMinigame
+from .player_cache import invalidate_all, invalidate_players
+
+# Связующая модель -> (поле справочника, поле с именем элемента справочника)
+THROUGH_MODELS = (
+    (PlayerEquipment, "equipment", "equipment_name"),
+    (PlayerHarvest, "harvest", "harvest_name"),
+    (PlayerMinigame, "minigame", "minigame_name"),
+)
+# Разделы документа игрока в том же порядке, что и THROUGH_MODELS
+SECTIONS = ("equipment", "harvest", "minigame")
+
+
+def _backfill_sql(model, catalog_field, name_field):
+    """
+    Собирает INSERT ... SELECT, добавляющий недостающие строки связующей
+    модели для диапазона игроков. Значения остальных полей берутся из
+    default модели, т.к. Django не переносит их в схему БД.
+    """
+    qn = connection.ops.quote_name
+    catalog = model._meta.get_field(catalog_field)
+    catalog_model = catalog.related_model
+
+    columns = ["player_id", catalog.column, name_field]
+    select = ["p.id", "c.id", "c.name"]
+    params = []
+
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.name in ("player", catalog_field, name_field):
+            continue
+        columns.append(field.column)
+        select.append("%s")
+        params.append(field.get_default())
+
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} "
+        f"({', '.join(qn(column) for column in columns)}) "
+        f"SELECT {', '.join(select)} "
+        f"FROM {qn(Player._meta.db_table)} p "
+        f"CROSS JOIN {qn(catalog_model._meta.db_table)} c "
+        f"WHERE p.id >= %s AND p.id < %s AND NOT EXISTS ("
+        f"SELECT 1 FROM {qn(model._meta.db_table)} t "
+        f"WHERE t.player_id = p.id AND t.{qn(catalog.column)} = c.id)"
+    )
+    return sql, params
+
+
+def backfill_player_rows(chunk_size=5000, pause=0, progress=None):
+    """
+    Создаёт для всех существующих игроков недостающие строки PlayerEquipment,
+    PlayerHarvest и PlayerMinigame. Игроки обрабатываются диапазонами id,
+    каждый диапазон - в отдельной короткой транзакции.
+
+    progress(done, total, created) вызывается после каждого диапазона.
+    Возвращает общее количество добавленных строк.
+    """
+    bounds = Player.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return 0
+
+    statements = [_backfill_sql(*through) for through in THROUGH_MODELS]
+    total = bounds["high"] - bounds["low"] + 1
+    created = 0
+
+    for start in range(bounds["low"], bounds["high"] + 1, chunk_size):
+        end = start + chunk_size
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            inserted = 0
+            sections = []
+            for section, (sql, params) in zip(SECTIONS, statements):
+                cursor.execute(sql, [*params, start, end])
+                if cursor.rowcount > 0:
+                    inserted += cursor.rowcount
+                    sections.append(section)
+            if inserted:
+                # Документы игроков получили новые элементы справочников
+                Player.objects.filter(id__gte=start, id__lt=end).bump_versions(
+                    *sections
+                )
+                invalidate_all()
+        created += inserted
+
+        if progress is not None:
+            progress(min(end - bounds["low"], total), total, created)
+
+        if pause:
+            time.sleep(pause)
+
+    return created
+
+
+def backfill_achievements(chunk_size=5000, pause=0, progress=None):
+    """
+    Пересчитывает Player.achievement_mask и achievement_count по
+    PlayerMinigame для всех игроков диапазонами id, как backfill_player_rows.
+    Нужен игрокам, созданным до появления маски, и после правок достижений в
+    обход refresh_achievements. Записываются только расхождения, поэтому
+    повторный запуск ничего не меняет.
+
+    progress(done, total, updated) вызывается после каждого диапазона.
+    Возвращает количество исправленных игроков.
+    """
+    bounds = Player.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return 0
+
+    total = bounds["high"] - bounds["low"] + 1
+    updated = 0
+
+    for start in range(bounds["low"], bounds["high"] + 1, chunk_size):
+        end = start + chunk_size
+
+        with transaction.atomic():
+            masks = defaultdict(int)
+            for player_id, minigame_id in PlayerMinigame.objects.filter(
+                player_id__gte=start, player_id__lt=end, achievement=True
+            ).values_list("player_id", "minigame_id"):
+                masks[player_id] |= Player.achievement_bit(minigame_id)
+
+            stale = []
+            for player in (
+                Player.objects.select_for_update()
+                .filter(id__gte=start, id__lt=end)
+                .only("id", "achievement_mask", "achievement_count")
+            ):
+                mask = masks.get(player.id, 0)
+                count = bin(mask).count("1")
+                if (player.achievement_mask, player.achievement_count) != (mask, count):
+                    player.achievement_mask = mask
+                    player.achievement_count = count
+                    stale.append(player)
+
+            if stale:
+                Player.objects.bulk_update(
+                    stale, ["achievement_mask", "achievement_count"]
+                )
+                # Достижения в таблицах лидеров собираются из маски
+                invalidate_players([player.id for player in stale])
+        updated += len(stale)
+
+        if progress is not None:
+            progress(min(end - bounds["low"], total), total, updated)
+
+        if pause:
+            time.sleep(pause)
+
+    return updated
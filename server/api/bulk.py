@@ -0,0 +1,156 @@
+from django.db import connection
+from django.db.models import Prefetch
+
+from .backfill import SECTIONS, THROUGH_MODELS
+from .histogram import record_score_changes
+from .models import Equipment, Harvest, Minigame, Player
+
+# Справочники по разделам документа игрока, ключи совпадают с PlayerSerializer
+CATALOG_MODELS = {"equipment": Equipment, "harvest": Harvest, "minigame": Minigame}
+
+
+def _player_fields():
+    return [field for field in Player._meta.concrete_fields if not field.primary_key]
+
+
+def _through_fields(model, catalog_field, name_field):
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in ("player", catalog_field, name_field)
+    ]
+
+
+def player_documents_queryset():
+    """Игроки в порядке id вместе со всеми связанными записями."""
+    return Player.objects.order_by("id").prefetch_related(
+        *(
+            Prefetch(f"{model._meta.model_name}_set", queryset=model.objects.all())
+            for model, _, _ in THROUGH_MODELS
+        )
+    )
+
+
+def player_document(player):
+    """
+    Полное состояние игрока в виде словаря. Вложенные разделы имеют тот же
+    вид, что и в ответе PlayerSerializer: {имя: {поле: значение}}.
+    """
+    document = {"id": player.id}
+    for field in _player_fields():
+        document[field.attname] = field.value_from_object(player)
+
+    for section, (model, catalog_field, name_field) in zip(SECTIONS, THROUGH_MODELS):
+        fields = _through_fields(model, catalog_field, name_field)
+        document[section] = {
+            getattr(row, name_field): {
+                field.attname: field.value_from_object(row) for field in fields
+            }
+            for row in getattr(player, f"{model._meta.model_name}_set").all()
+        }
+
+    return document
+
+
+def bulk_create_players(documents, keep_ids=False, batch_size=1000):
+    """
+    Создаёт игроков и их связанные записи через bulk_create, минуя post_save
+    сигналы. Элементы справочников, отсутствующие в документе, создаются со
+    значениями по умолчанию. Возвращает количество вставленных строк.
+    """
+    catalogs = {
+        section: dict(model.objects.values_list("name", "id"))
+        for section, model in CATALOG_MODELS.items()
+    }
+    player_fields = {field.attname for field in _player_fields()}
+
+    players = []
+    for document in documents:
+        player = Player(
+            **{key: value for key, value in document.items() if key in player_fields}
+        )
+        if keep_ids:
+            player.id = document["id"]
+
+        mask = 0
+        minigame_ids = catalogs["minigame"]
+        for name, item in document.get("minigame", {}).items():
+            if item.get("achievement") and name in minigame_ids:
+                mask |= Player.achievement_bit(minigame_ids[name])
+        player.achievement_mask = mask
+        player.achievement_count = bin(mask).count("1")
+
+        players.append(player)
+
+    Player.objects.bulk_create(players, batch_size=batch_size)
+
+    # Не все СУБД возвращают id из bulk_create
+    if any(player.pk is None for player in players):
+        ids = dict(
+            Player.objects.filter(
+                name__in=[player.name for player in players]
+            ).values_list("name", "id")
+        )
+        for player in players:
+            player.pk = ids[player.name]
+
+    created = len(players)
+    record_score_changes((None, player.top_score) for player in players)
+
+    for section, (model, catalog_field, name_field) in zip(SECTIONS, THROUGH_MODELS):
+        fields = _through_fields(model, catalog_field, name_field)
+        defaults = [field.get_default() for field in fields]
+        columns = [
+            "player_id",
+            model._meta.get_field(catalog_field).column,
+            name_field,
+            *(field.column for field in fields),
+        ]
+        rows = []
+        for player, document in zip(players, documents):
+            items = document.get(section, {})
+            for name, catalog_id in catalogs[section].items():
+                item = items.get(name, {})
+                rows.append(
+                    (
+                        player.pk,
+                        catalog_id,
+                        name,
+                        *(
+                            field.get_db_prep_save(
+                                item.get(field.attname, default), connection
+                            )
+                            for field, default in zip(fields, defaults)
+                        ),
+                    )
+                )
+
+        insert_rows(model, columns, rows, batch_size=batch_size)
+        created += len(rows)
+
+    return created
+
+
+def insert_rows(model, columns, rows, batch_size=1000):
+    """
+    Вставляет готовые кортежи значений многострочными INSERT ... VALUES.
+    Для связующих таблиц это на порядок быстрее bulk_create, т.к. не создаются
+    экземпляры моделей.
+    """
+    qn = connection.ops.quote_name
+    fields = [model._meta.get_field(column) for column in columns]
+    batch_size = min(batch_size, connection.ops.bulk_batch_size(fields, rows))
+    head = (
+        f"INSERT INTO {qn(model._meta.db_table)} "
+        f"({', '.join(qn(column) for column in columns)}) VALUES "
+    )
+    placeholder = f"({', '.join(['%s'] * len(columns))})"
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            cursor.execute(
+                head + ", ".join([placeholder] * len(batch)),
+                [value for row in batch for value in row],
+            )
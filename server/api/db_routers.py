@@ -0,0 +1,98 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+# Включается на время обработки запросов, которым разрешено читать с реплик
+_read_from_replicas = ContextVar("read_from_replicas", default=False)
+
+
+def sticky_key(player_id):
+    return f"replica-sticky:{player_id}"
+
+
+def mark_player_written(player_id):
+    """После записи игрок читается с основной БД в течение окна прилипания."""
+    if settings.REPLICA_DATABASES and player_id is not None:
+        cache.set(sticky_key(player_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_player_sticky(player_id):
+    return cache.get(sticky_key(player_id), False)
+
+
+class ReplicaRouter:
+    """
+    Чтение в запросах, помеченных ReplicaReadMixin, уходит на случайную
+    реплику из REPLICA_DATABASES, всё остальное - на default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replicas.get() and settings.REPLICA_DATABASES:
+            return random.choice(settings.REPLICA_DATABASES)
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Примесь для APIView/ViewSet: безопасные запросы из replica_actions
+    (None - все) читают с реплик. Если в url есть идентификатор игрока
+    (player_lookup_kwarg) и игрок недавно изменялся, чтение остаётся на
+    основной БД. Действия из write_actions и небезопасные методы запускают
+    окно прилипания для игрока.
+    """
+
+    replica_actions = None
+    write_actions = ()
+    player_lookup_kwarg = None
+
+    def reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS or self.is_write(request):
+            return False
+
+        action = getattr(self, "action", None)
+        if self.replica_actions is not None and action not in self.replica_actions:
+            return False
+
+        player_id = self.kwargs.get(self.player_lookup_kwarg)
+        return player_id is None or not is_player_sticky(player_id)
+
+    def is_write(self, request):
+        return (
+            request.method not in SAFE_METHODS
+            or getattr(self, "action", None) in self.write_actions
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            self._replica_token = _read_from_replicas.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _read_from_replicas.reset(token)
+            self._replica_token = None
+
+        if (
+            self.player_lookup_kwarg
+            and self.is_write(request)
+            and response.status_code < 400
+        ):
+            player_id = self.kwargs.get(self.player_lookup_kwarg)
+            if player_id is None and isinstance(getattr(response, "data", None), dict):
+                player_id = response.data.get("id")
+            mark_player_written(player_id)
+
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .models import Player
+from .serializers import LeaderboardPlayerSerializer
+
+
+class Subscription:
+    """
+    Очередь событий одного подписчика. Создаётся в цикле событий ASGI,
+    события в неё кладутся из любого потока. Если подписчик не успевает
+    читать, подписка закрывается: клиент переподключится и получит
+    актуальное состояние заново.
+    """
+
+    def __init__(self, channels, maxsize):
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, channel, data):
+        try:
+            self.loop.call_soon_threadsafe(self._put, channel, data)
+        except RuntimeError:
+            # Цикл событий уже остановлен
+            pass
+
+    def _put(self, channel, data):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((channel, data))
+        except asyncio.QueueFull:
+            # Недоставленные события теряют смысл, остаётся только признак
+            # закрытия подписки
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            metrics.increment("events.overflowed")
+
+    async def get(self, timeout=None):
+        """
+        Следующее событие (канал, данные) или None, если подписка закрыта.
+        По истечении timeout выбрасывает asyncio.TimeoutError.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """
+    Рассылка событий подписчикам текущего процесса. Канал вида
+    "player:*" получает события всех каналов "player:<id>".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscribers.get(channel))
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscribers.values()))
+
+    def publish(self, channel, data):
+        self.dispatch(channel, data)
+
+    def dispatch(self, channel, data):
+        wildcard = f"{channel.split(':', 1)[0]}:*"
+        with self._lock:
+            targets = self._subscribers.get(channel, set()) | self._subscribers.get(
+                wildcard, set()
+            )
+        for subscription in targets:
+            subscription.put(channel, data)
+        metrics.increment("events.published")
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Рассылка между процессами через LISTEN/NOTIFY PostgreSQL. Каждый
+    процесс слушает канал EVENTS_PG_CHANNEL в отдельном потоке и раздаёт
+    полученные события своим подписчикам, в том числе собственные.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, channels):
+        self._ensure_listener()
+        return super().subscribe(channels)
+
+    def publish(self, channel, data):
+        payload = json.dumps({"channel": channel, "data": data}, cls=DjangoJSONEncoder)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [settings.EVENTS_PG_CHANNEL, payload]
+            )
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="events-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                metrics.increment("events.listener_errors")
+                time.sleep(1)
+
+    def _listen_once(self):
+        # Отдельное соединение, не связанное с запросами Django
+        wrapper = connections["default"]
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {settings.EVENTS_PG_CHANNEL}")
+            while True:
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    message = json.loads(conn.notifies.pop(0).payload)
+                    self.dispatch(message["channel"], message["data"])
+        finally:
+            conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENT_BROKER)()
+
+
+def publish(channel, data):
+    """Отправляет событие подписчикам после фиксации транзакции."""
+    transaction.on_commit(lambda: get_broker().publish(channel, data))
+
+
+def publish_player(player_id, version=None):
+    """
+    Событие об изменении игрока. Клиент догружает изменения через
+    /api/v1/player/{id}/sync/ начиная со своей версии.
+    """
+    publish(f"player:{player_id}", {"id": player_id, "version": version})
+
+
+class LeaderboardFeed:
+    """
+    Таблица лидеров для подписчиков процесса. Пересчитывается после
+    изменений игроков, но не чаще раза в LEADERBOARD_PUSH_INTERVAL секунд,
+    и рассылается разницей: строки, которые появились или изменились, и,
+    если поменялся порядок, список имён по местам (order). Игроки, которых
+    нет в order, выбыли из таблицы. Применение разницы повторно ничего не
+    меняет, поэтому подписчик может получить её поверх уже включающего её
+    снимка.
+    """
+
+    def __init__(self):
+        self.rows = None
+        self.seq = 0
+        self._task = None
+        self._lock = None
+
+    def load_rows(self):
+        # Тот же набор, что и в LiderboardView.list
+        queryset = Player.objects.filter(top_score__gt=0).order_by("-top_score")[
+            : settings.LEADERBOARD_PUSH_SIZE
+        ]
+        rows = LeaderboardPlayerSerializer(queryset, many=True).data
+        # Порядок ключей совпадает с местами в таблице
+        return {row["name"]: dict(row) for row in rows}
+
+    async def snapshot(self):
+        """Текущая таблица целиком в виде события сброса."""
+        await self.refresh_if_empty()
+        self.ensure_running()
+        return {
+            "seq": self.seq,
+            "reset": True,
+            "updated": list(self.rows.values()),
+            "order": list(self.rows),
+        }
+
+    async def refresh_if_empty(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.rows is None:
+                self.rows = await sync_to_async(self.load_rows)()
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        broker = get_broker()
+        subscription = broker.subscribe(["player:*"])
+        try:
+            while True:
+                # Ждём любого изменения игрока, события за время паузы
+                # объединяются в один пересчёт
+                await subscription.get()
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                if subscription.overflowed:
+                    broker.unsubscribe(subscription)
+                    subscription = broker.subscribe(["player:*"])
+
+                if broker.has_subscribers("leaderboard"):
+                    await self.push()
+                else:
+                    # Следующий подписчик получит свежий снимок
+                    self.rows = None
+                await asyncio.sleep(settings.LEADERBOARD_PUSH_INTERVAL)
+        finally:
+            broker.unsubscribe(subscription)
+
+    async def push(self):
+        rows = await sync_to_async(self.load_rows)()
+        previous = self.rows or {}
+        self.rows = rows
+
+        diff = {
+            "updated": [row for name, row in rows.items() if previous.get(name) != row]
+        }
+        if list(rows) != list(previous):
+            diff["order"] = list(rows)
+
+        if diff["updated"] or "order" in diff:
+            self.seq += 1
+            metrics.increment("events.leaderboard_diffs")
+            # Каждый процесс считает разницу сам, поэтому только локально
+            get_broker().dispatch("leaderboard", {"seq": self.seq, **diff})
+
+
+leaderboard_feed = LeaderboardFeed()
+
+
+def cancel_on_disconnect(app, prefix):
+    """
+    ASGI-обёртка для потоковых ответов по адресам с префиксом prefix.
+    Django не следит за отключением клиента во время потоковой передачи,
+    поэтому после чтения запроса обёртка ждёт http.disconnect и отменяет
+    обработку, чтобы генератор события закрыл подписку.
+    """
+
+    async def application(scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(prefix):
+            return await app(scope, receive, send)
+
+        request_read = asyncio.Event()
+
+        async def receive_request():
+            message = await receive()
+            if message["type"] != "http.request" or not message.get("more_body"):
+                request_read.set()
+            return message
+
+        async def watch():
+            await request_read.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        handler = asyncio.ensure_future(app(scope, receive_request, send))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.wait((handler, watcher), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (handler, watcher):
+                task.cancel()
+        if not handler.cancelled() and handler.done():
+            handler.result()
+
+    return application
+
+
+metrics.register_gauge("events.subscribers", lambda: get_broker().subscriber_count())
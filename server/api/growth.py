@@ -0,0 +1,143 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Harvest, PlayerEquipment, PlayerHarvest
+
+SECONDS_PER_HOUR = 3600
+
+
+def catalog_rates():
+    """Прирост урожая из справочника: id урожая -> единиц в час."""
+    return dict(Harvest.objects.values_list("id", "growth_rate"))
+
+
+def equipment_multipliers(player_ids):
+    """
+    Множитель прироста урожая по игрокам: 1 плюс бонусы
+    HARVEST_EQUIPMENT_BONUS купленного оборудования. Один запрос на всех.
+    """
+    bonuses = settings.HARVEST_EQUIPMENT_BONUS
+    multipliers = dict.fromkeys(player_ids, 1.0)
+    for player_id, name in PlayerEquipment.objects.filter(
+        player_id__in=list(multipliers), available=True
+    ).values_list("player_id", "equipment_name"):
+        multipliers[player_id] += bonuses.get(name, 0)
+    return multipliers
+
+
+def effective_rate(harvest, rates, multiplier):
+    """
+    Прирост урожая игрока в единицах в час. Недоступный урожай не растёт,
+    генная модификация умножает прирост на HARVEST_GEN_MODIFIED_MULTIPLIER.
+    """
+    if not harvest.available:
+        return 0.0
+    rate = harvest.growth_rate
+    if rate is None:
+        rate = rates.get(harvest.harvest_id, 0)
+    if harvest.gen_modified:
+        rate *= settings.HARVEST_GEN_MODIFIED_MULTIPLIER
+    return rate * multiplier
+
+
+def amount_at(amount, rate, last_tick, now):
+    """Количество урожая на момент now по количеству на момент last_tick."""
+    elapsed = max((now - last_tick).total_seconds(), 0)
+    return amount + int(rate * elapsed / SECONDS_PER_HOUR)
+
+
+def grow(harvests, now=None):
+    """
+    Текущее состояние записей PlayerHarvest любых игроков: список
+    (запись, количество, прирост). Справочник и оборудование читаются
+    двумя запросами на весь список.
+    """
+    now = now or timezone.now()
+    rates = catalog_rates()
+    multipliers = equipment_multipliers({harvest.player_id for harvest in harvests})
+    result = []
+    for harvest in harvests:
+        rate = effective_rate(harvest, rates, multipliers[harvest.player_id])
+        result.append(
+            (
+                harvest,
+                amount_at(harvest.harvest_amount, rate, harvest.last_tick, now),
+                rate,
+            )
+        )
+    return result
+
+
+def evaluate(player_ids, now=None):
+    """
+    Текущий урожай игроков без записи в БД: {id игрока: {урожай: количество}}.
+    Для таблиц лидеров и аналитики, три запроса на любой список игроков.
+    """
+    harvests = PlayerHarvest.objects.filter(player_id__in=player_ids).only(
+        "player_id",
+        "harvest_id",
+        "harvest_name",
+        "harvest_amount",
+        "available",
+        "gen_modified",
+        "growth_rate",
+        "last_tick",
+    )
+    amounts = defaultdict(dict)
+    for harvest, amount, _ in grow(list(harvests), now):
+        amounts[harvest.player_id][harvest.harvest_name] = amount
+    return dict(amounts)
+
+
+def materialize(player_ids, now=None):
+    """
+    Записывает выросший урожай игроков в harvest_amount. Вызывается перед
+    изменениями, от которых зависит прирост: доступность урожая, генная
+    модификация, оборудование. Время, не давшее целой единицы урожая,
+    остаётся в last_tick и не теряется.
+
+    Недоступный урожай не растёт, поэтому читаются только доступные записи,
+    а записываются только выросшие.
+    """
+    with transaction.atomic():
+        harvests = list(
+            PlayerHarvest.objects.select_for_update().filter(
+                player_id__in=player_ids, available=True
+            )
+        )
+        grown = []
+        for harvest, amount, rate in grow(harvests, now):
+            if amount > harvest.harvest_amount:
+                harvest.last_tick += timedelta(
+                    hours=(amount - harvest.harvest_amount) / rate
+                )
+                harvest.harvest_amount = amount
+                grown.append(harvest)
+        PlayerHarvest.objects.bulk_update(grown, ["harvest_amount", "last_tick"])
+    return grown
+
+
+def grow_document(document, now=None):
+    """
+    Документ игрока (PlayerSerializer) с урожаем на момент now. Нужен для
+    документов из кэша, собранных раньше.
+    """
+    now = now or timezone.now()
+    harvest = {
+        name: {
+            **item,
+            "harvest_amount": amount_at(
+                item["base_amount"],
+                item["growth_rate"],
+                parse_datetime(item["last_tick"]),
+                now,
+            ),
+        }
+        for name, item in document["harvest"].items()
+    }
+    return {**document, "harvest": harvest}
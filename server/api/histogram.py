@@ -0,0 +1,143 @@
+"""
+Гистограмма Player.top_score для приблизительного места в рейтинге.
+
+Корзина 0 - счёт <= 0. Каждый интервал [2^e, 2^(e+1)) делится на
+SUB_BUCKETS равных корзин, поэтому ширина корзины не больше 1/SUB_BUCKETS
+от счёта, а всего корзин не больше нескольких сотен.
+
+Игроки из корзин выше корзины игрока считаются точно, внутри своей корзины
+место интерполируется линейно. Точное место (1 + количество игроков с большим
+счётом) отличается от приблизительного не больше чем на rank_error =
+количество игроков в корзине игрока минус один.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Player, ScoreHistogramBucket
+
+SUB_BUCKETS = 8
+
+
+def bucket_of(score):
+    if score <= 0:
+        return 0
+    exponent = score.bit_length() - 1
+    return (
+        1
+        + exponent * SUB_BUCKETS
+        + ((score - (1 << exponent)) * SUB_BUCKETS >> exponent)
+    )
+
+
+def bucket_bounds(bucket):
+    """Границы корзины [low, high), для корзины 0 - [0, 1)."""
+    if bucket == 0:
+        return 0, 1
+    exponent, sub = divmod(bucket - 1, SUB_BUCKETS)
+    base = 1 << exponent
+    return (
+        base + -(-sub * base // SUB_BUCKETS),
+        base + -(-(sub + 1) * base // SUB_BUCKETS),
+    )
+
+
+def record_score_changes(changes):
+    """
+    Переносит игроков между корзинами. changes - пары (старый, новый)
+    top_score, None означает появление или удаление игрока.
+
+    Корзины меняются после фиксации транзакции вызывающего кода, каждая
+    отдельным коротким UPDATE и всегда в порядке возрастания номера: строки
+    корзин не блокируются на время длинных транзакций, а одновременные
+    писатели не ждут друг друга по кругу. При откате транзакции изменения
+    не применяются.
+    """
+    deltas = Counter()
+    for old, new in changes:
+        old_bucket = None if old is None else bucket_of(old)
+        new_bucket = None if new is None else bucket_of(new)
+        if old_bucket == new_bucket:
+            continue
+        if old_bucket is not None:
+            deltas[old_bucket] -= 1
+        if new_bucket is not None:
+            deltas[new_bucket] += 1
+
+    deltas = {bucket: delta for bucket, delta in sorted(deltas.items()) if delta}
+    if deltas:
+        transaction.on_commit(lambda: apply_bucket_deltas(deltas))
+
+
+def apply_bucket_deltas(deltas):
+    for bucket, delta in sorted(deltas.items()):
+        updated = ScoreHistogramBucket.objects.filter(bucket=bucket).update(
+            count=F("count") + delta
+        )
+        if not updated:
+            _, created = ScoreHistogramBucket.objects.get_or_create(
+                bucket=bucket, defaults={"count": delta}
+            )
+            if not created:
+                ScoreHistogramBucket.objects.filter(bucket=bucket).update(
+                    count=F("count") + delta
+                )
+
+
+def record_score_change(old, new):
+    record_score_changes([(old, new)])
+
+
+def rebuild_histogram():
+    """
+    Пересчитывает гистограмму целиком по таблице игроков. Запускается при
+    развёртывании (scripts/rebuildhistogram.sh) и исправляет расхождения,
+    накопленные изменениями top_score в обход record_score_change(s).
+    """
+    with transaction.atomic():
+        return _rebuild_histogram()
+
+
+def _rebuild_histogram():
+    counts = Counter()
+    for score, count in (
+        Player.objects.values_list("top_score")
+        .annotate(count=Count("id"))
+        .order_by()
+        .iterator()
+    ):
+        counts[bucket_of(score)] += count
+
+    ScoreHistogramBucket.objects.exclude(bucket__in=counts).delete()
+    ScoreHistogramBucket.objects.bulk_create(
+        [
+            ScoreHistogramBucket(bucket=bucket, count=count)
+            for bucket, count in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["bucket"],
+        update_fields=["count"],
+    )
+    return counts
+
+
+def load_histogram():
+    return dict(ScoreHistogramBucket.objects.values_list("bucket", "count"))
+
+
+def approximate_rank(score, histogram=None):
+    """Возвращает (место, погрешность места, всего игроков) за O(корзин)."""
+    if histogram is None:
+        histogram = load_histogram()
+
+    bucket = bucket_of(score)
+    total = sum(histogram.values())
+    above = sum(count for other, count in histogram.items() if other > bucket)
+    same = max(histogram.get(bucket, 0), 1)
+
+    low, high = bucket_bounds(bucket)
+    share = (high - 1 - min(max(score, low), high - 1)) / max(high - 1 - low, 1)
+
+    return above + 1 + round((same - 1) * share), same - 1, max(total, 1)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from . import metrics
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Пауза между проверками, пока тот же запрос выполняется в другом процессе
+POLL_INTERVAL = 0.05
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Запрос с этим Idempotency-Key ещё выполняется"
+    default_code = "idempotency_conflict"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Idempotency-Key уже использован для другого запроса"
+    default_code = "idempotency_key_reused"
+
+
+class Replay(Exception):
+    """Прерывает обработку запроса сохранённым ответом."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def get_cache():
+    return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+
+def fingerprint(request):
+    """Отпечаток запроса: один ключ нельзя использовать для разных данных."""
+    body = json.dumps(request.data, cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha256(
+        f"{request.method} {request.path}\n{body}".encode()
+    ).hexdigest()
+
+
+class IdempotentRequest:
+    """
+    Выполнение запроса с заголовком Idempotency-Key. Сохранённый ответ
+    (статус и данные) хранится в кэше IDEMPOTENCY_TTL секунд. Пока запрос
+    выполняется, ключ занят блокировкой: повторы ждут и получают его ответ.
+    """
+
+    def __init__(self, request, key):
+        digest = hashlib.sha256(f"{request.path}:{key}".encode()).hexdigest()
+        self.response_key = f"idempotency:{digest}"
+        self.lock_key = f"idempotency:{digest}:lock"
+        self.fingerprint = fingerprint(request)
+        self.token = uuid.uuid4().hex
+
+    def has_response(self):
+        """Есть ли сохранённый ответ: такой повтор не выполняет запрос."""
+        return get_cache().get(self.response_key) is not None
+
+    def begin(self):
+        """
+        Возвращает сохранённый ответ или None, если запрос нужно выполнить:
+        тогда ключ занят этим запросом до save() или release().
+        """
+        cache = get_cache()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+        waited = False
+
+        while True:
+            stored = cache.get(self.response_key)
+            if stored is not None:
+                if stored["fingerprint"] != self.fingerprint:
+                    raise IdempotencyKeyReused()
+                metrics.increment(
+                    "idempotency.collapsed" if waited else "idempotency.replayed"
+                )
+                response = Response(stored["data"], status=stored["status"])
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            if cache.add(self.lock_key, self.token, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return None
+
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflict()
+            waited = True
+            time.sleep(POLL_INTERVAL)
+
+    def save(self, response):
+        cache = get_cache()
+        # Ответы 5xx не сохраняются: повтор выполнит запрос заново
+        if response.status_code < 500:
+            cache.set(
+                self.response_key,
+                {
+                    "fingerprint": self.fingerprint,
+                    "status": response.status_code,
+                    "data": response.data,
+                },
+                settings.IDEMPOTENCY_TTL,
+            )
+            metrics.increment("idempotency.stored")
+        self.release()
+
+    def release(self):
+        cache = get_cache()
+        if cache.get(self.lock_key) == self.token:
+            cache.delete(self.lock_key)
+
+
+class IdempotentWriteMixin:
+    """
+    Примесь для ViewSet с ReplicaReadMixin: изменяющие запросы (is_write) с
+    заголовком Idempotency-Key выполняются один раз, повторы получают
+    сохранённый ответ без обращения к таблицам игроков. Сохранённый ответ
+    ищется до проверок DRF, чтобы повтор не расходовал лимиты троттлинга.
+    """
+
+    _idempotent_request = None
+    _replay_stored = False
+
+    def initial(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        idempotent_request = None
+        if key is not None and self.is_write(request):
+            if not key or len(key) > MAX_KEY_LENGTH:
+                message = f"Ключ должен быть непустым, до {MAX_KEY_LENGTH} символов"
+                raise ValidationError({HEADER: message})
+            idempotent_request = IdempotentRequest(request, key)
+            # Повтор с сохранённым ответом не расходует лимиты троттлинга
+            self._replay_stored = idempotent_request.has_response()
+
+        super().initial(request, *args, **kwargs)
+        if idempotent_request is None:
+            return
+
+        stored = idempotent_request.begin()
+        if stored is not None:
+            raise Replay(stored)
+        self._idempotent_request = idempotent_request
+
+    def check_throttles(self, request):
+        if not self._replay_stored:
+            super().check_throttles(request)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # Необработанная ошибка: ключ освобождается для повтора
+            if self._idempotent_request is not None:
+                self._idempotent_request.release()
+                self._idempotent_request = None
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self._idempotent_request is not None:
+            self._idempotent_request.save(response)
+            self._idempotent_request = None
+        return response
@@ -0,0 +1,302 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q, Value
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from .archive import archive_players
+from .backfill import THROUGH_MODELS, backfill_achievements, backfill_player_rows
+from .growth import materialize
+from .minigame_leaderboard import rebuild_minigame_histograms
+from .minigame_results import opening_minigame_id
+from .models import Job, Player
+from .player_cache import invalidate_players
+from .scores import aggregate_score_events
+
+logger = logging.getLogger(__name__)
+
+# Имя задачи -> функция(context, **payload)
+registry = {}
+
+
+def job(name):
+    def decorator(func):
+        registry[name] = func
+        return func
+
+    return decorator
+
+
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, done, total=None):
+        """Сохраняет прогресс, чтобы его было видно в админке."""
+        Job.objects.filter(pk=self.job.pk).update(progress=done, total=total)
+
+
+def enqueue(name, key=None, max_attempts=3, run_after=None, **payload):
+    """
+    Ставит задачу в очередь. Если задача с таким key уже есть, возвращается
+    она, а новая не создаётся.
+    """
+    if name not in registry:
+        raise KeyError(f"Unknown job: {name}")
+
+    defaults = {
+        "name": name,
+        "payload": payload,
+        "max_attempts": max_attempts,
+        "run_after": run_after or timezone.now(),
+    }
+    if key is None:
+        return Job.objects.create(**defaults)
+
+    job, _ = Job.objects.get_or_create(key=key, defaults=defaults)
+    return job
+
+
+def lease_until():
+    return timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+
+def lease_owner():
+    """Владелец аренды: хост, процесс и случайная часть, своя у каждого захвата."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_next():
+    """
+    Забирает следующую готовую задачу: ожидающую или выполняющуюся, чья
+    аренда истекла (воркер завершился аварийно). Захват - условный UPDATE,
+    поэтому одну задачу не заберут два воркера и на SQLite, и на PostgreSQL.
+
+    Возвращает (id задачи, владелец аренды) или None. Владелец передаётся в
+    run_job и fail_job: после потери аренды их запись не затрёт состояние,
+    которое пишет новый владелец.
+    """
+    now = timezone.now()
+    ready = Q(status="pending", run_after__lte=now) | Q(
+        status="running", locked_until__lt=now
+    )
+    candidates = Job.objects.filter(ready).order_by("run_after", "id")
+
+    for job_id in candidates.values_list("id", flat=True)[:10]:
+        owner = lease_owner()
+        claimed = Job.objects.filter(ready, id=job_id).update(
+            status="running",
+            started_at=now,
+            locked_until=lease_until(),
+            locked_by=owner,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return job_id, owner
+
+    return None
+
+
+def finish_job(job_id, owner, **changes):
+    """
+    Записывает итог задачи, только пока аренда принадлежит owner. Возвращает
+    False, если задачу уже забрал другой воркер.
+    """
+    finished = Job.objects.filter(id=job_id, status="running", locked_by=owner).update(
+        locked_until=None, finished_at=timezone.now(), **changes
+    )
+    if not finished:
+        logger.warning("Job #%s lost its lease, result of %s discarded", job_id, owner)
+    return bool(finished)
+
+
+def fail_job(job_id, owner, error, duration=None):
+    """
+    Записывает ошибку задачи: повтор с экспоненциальной задержкой, пока
+    есть попытки, иначе статус failed. Возвращает новый статус или "lost",
+    если аренда потеряна.
+    """
+    job = Job.objects.only("attempts", "max_attempts").get(id=job_id)
+    if job.attempts < job.max_attempts:
+        status = "pending"
+        run_after = timezone.now() + timedelta(seconds=2**job.attempts)
+    else:
+        status = "failed"
+        run_after = F("run_after")
+    if not finish_job(
+        job_id,
+        owner,
+        status=status,
+        error=error,
+        run_after=run_after,
+        duration=duration,
+    ):
+        return "lost"
+    return status
+
+
+class Heartbeat(threading.Thread):
+    """Продлевает аренду задачи, пока она выполняется и принадлежит owner."""
+
+    def __init__(self, job_id, owner):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.owner = owner
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_LEASE_SECONDS / 3):
+                Job.objects.filter(
+                    id=self.job_id, status="running", locked_by=self.owner
+                ).update(locked_until=lease_until())
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job_id, owner):
+    job = Job.objects.get(id=job_id)
+    if job.attempts > job.max_attempts:
+        # Задачу забрали после истечения аренды, а попытки кончились
+        return fail_job(job_id, owner, job.error or "Воркер задачи завершился аварийно")
+
+    started = time.monotonic()
+    heartbeat = Heartbeat(job_id, owner)
+    heartbeat.start()
+    try:
+        registry[job.name](JobContext(job), **job.payload)
+    except Exception:
+        error = traceback.format_exc()
+    else:
+        error = None
+    finally:
+        heartbeat.stop()
+
+    if error is not None:
+        return fail_job(job_id, owner, error, duration=time.monotonic() - started)
+
+    if not finish_job(
+        job_id, owner, status="done", error="", duration=time.monotonic() - started
+    ):
+        return "lost"
+    return "done"
+
+
+@job("backfill_player_rows")
+def backfill_player_rows_job(context, chunk_size=5000, pause=0):
+    backfill_player_rows(
+        chunk_size=chunk_size,
+        pause=pause,
+        progress=lambda done, total, created: context.progress(done, total),
+    )
+
+
+@job("backfill_achievements")
+def backfill_achievements_job(context, chunk_size=5000, pause=0):
+    backfill_achievements(
+        chunk_size=chunk_size,
+        pause=pause,
+        progress=lambda done, total, updated: context.progress(done, total),
+    )
+
+
+@job("aggregate_scores")
+def aggregate_scores_job(context, batch_size=10000):
+    processed = 0
+    while count := aggregate_score_events(batch_size):
+        processed += count
+        context.progress(processed)
+
+
+@job("archive_players")
+def archive_players_job(context, inactive_days=None, batch_size=1000):
+    archive_players(
+        inactive_days or settings.ARCHIVE_INACTIVE_DAYS,
+        batch_size=batch_size,
+        progress=context.progress,
+    )
+
+
+@job("reset_players")
+def reset_players_job(context, player_ids=None, chunk_size=5000):
+    """Массовый сброс прогресса игроков, как в действии newgame."""
+    players = Player.objects.order_by("id")
+    if player_ids is not None:
+        players = players.filter(id__in=player_ids)
+
+    ids = list(players.values_list("id", flat=True))
+    defaults = {
+        field: Player._meta.get_field(field).get_default()
+        for field in ("own_money", "own_coins", "credit")
+    }
+    reset = {
+        "playerequipment": {"available": False},
+        "playerharvest": {"available": False, "gen_modified": False},
+        "playerminigame": {
+            # Открытой остаётся только первая мини-игра справочника
+            "available": Exact(F("minigame_id"), Value(opening_minigame_id())),
+            "complete": False,
+            "achievement": False,
+            "score": 0,
+        },
+    }
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        with transaction.atomic():
+            # Выросший урожай фиксируется до остановки роста
+            materialize(chunk)
+            for model, _, _ in THROUGH_MODELS:
+                model.objects.filter(player_id__in=chunk).update(
+                    **reset[model._meta.model_name]
+                )
+            Player.objects.filter(id__in=chunk).update(
+                **defaults,
+                achievement_mask=0,
+                achievement_count=0,
+                **Player.version_changes(*Player.SYNC_SECTIONS),
+            )
+            invalidate_players(chunk)
+        context.progress(start + len(chunk), len(ids))
+
+
+def schedule_minigame_histograms():
+    """
+    Ставит пересчёт гистограмм мини-игр на начало следующего интервала
+    MINIGAME_HISTOGRAM_INTERVAL. Ключ - номер интервала, поэтому повторная
+    постановка (например, при каждом развёртывании) не создаёт параллельных
+    цепочек задач.
+    """
+    interval = settings.MINIGAME_HISTOGRAM_INTERVAL
+    now = timezone.now()
+    slot = int(now.timestamp() // interval) + 1
+    return enqueue(
+        "rebuild_minigame_histograms",
+        key=f"rebuild_minigame_histograms:{slot}",
+        run_after=now + timedelta(seconds=slot * interval - now.timestamp()),
+    )
+
+
+@job("rebuild_minigame_histograms")
+def rebuild_minigame_histograms_job(context):
+    """
+    Пересчитывает гистограммы мини-игр и ставит следующий пересчёт. После
+    ошибки следующий пересчёт ставит только удачный повтор, иначе повторы
+    начали бы параллельные цепочки. До пересчёта запросы получают прежние
+    корзины.
+    """
+    rebuild_minigame_histograms()
+    schedule_minigame_histograms()
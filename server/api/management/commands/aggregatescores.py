@@ -0,0 +1,46 @@
+import time
+
+from api.scores import aggregate_score_events
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Fold ingested score events into players and leaderboards"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Количество событий, обрабатываемых в одной транзакции",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Работать постоянно, ожидая новые события",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда новых событий нет",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            processed = aggregate_score_events(options["batch_size"])
+
+            if processed:
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"Aggregated {processed} events in {elapsed:.2f}s "
+                    f"({processed / elapsed:.0f} events/s)"
+                )
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("No pending score events"))
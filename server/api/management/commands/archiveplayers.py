@@ -0,0 +1,45 @@
+import time
+
+from api.archive import archive_players
+from api.models import ArchivedPlayer, Player
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Move inactive players to the cold archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ARCHIVE_INACTIVE_DAYS,
+            help="Архивировать игроков без обращений дольше этого числа дней",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество игроков в одной транзакции",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(archived):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"Archived {archived} players in {elapsed:.1f}s "
+                f"({archived / max(elapsed, 1e-9):.0f} players/s)"
+            )
+
+        archived = archive_players(
+            options["days"], batch_size=options["batch_size"], progress=progress
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} players, "
+                f"{Player.objects.count()} active, "
+                f"{ArchivedPlayer.objects.count()} in archive"
+            )
+        )
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from api.models import Player
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+# Профиль -> (PRAGMA и очередь писателей включены, journal_mode файла базы)
+PROFILES = (
+    ("default", False, "DELETE"),
+    ("tuned", True, "WAL"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent API throughput on SQLite with default settings and "
+        "with the tuned profile. Writes wallet increments to the current database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=16, help="Количество клиентов"
+        )
+        parser.add_argument(
+            "--seconds", type=float, default=5, help="Длительность прогона профиля"
+        )
+        parser.add_argument(
+            "--write-ratio",
+            type=float,
+            default=0.5,
+            help="Доля пишущих запросов (POST increment), остальные - GET игрока",
+        )
+        parser.add_argument(
+            "--players",
+            type=int,
+            default=1000,
+            help="Количество игроков, между которыми распределяются запросы",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The default database is not SQLite")
+        ids = list(
+            Player.objects.order_by("id").values_list("id", flat=True)[
+                : options["players"]
+            ]
+        )
+        if not ids:
+            raise CommandError("No players found, run generateplayers first")
+
+        header = (
+            f"{'profile':<8} {'requests':>9} {'req/s':>8} {'writes/s':>9} "
+            f"{'errors':>7} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        for name, tuned, journal_mode in PROFILES:
+            result = self.run_profile(tuned, journal_mode, ids, options)
+            self.stdout.write(
+                f"{name:<8} {result['requests']:>9} {result['rps']:>8.0f} "
+                f"{result['wps']:>9.0f} {result['errors']:>7} "
+                f"{result['p50']:>8.1f} {result['p99']:>8.1f}"
+            )
+            for error, count in result["error_kinds"].most_common(3):
+                self.stdout.write(f"  {count} x {error}")
+
+        # Файл базы возвращается в режим, который задают настройки
+        self.set_journal_mode(
+            settings.SQLITE_PRAGMAS["journal_mode"]
+            if settings.SQLITE_TUNING
+            else "DELETE"
+        )
+
+    def set_journal_mode(self, journal_mode):
+        connections.close_all()
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        connections.close_all()
+
+    def run_profile(self, tuned, journal_mode, ids, options):
+        # Лимиты запросов не должны влиять на замер
+        rest_framework = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {
+                "player_write": "1000000/min",
+                "ip_write": "1000000/min",
+            },
+        }
+        with override_settings(
+            SQLITE_TUNING=tuned,
+            SQLITE_SERIALIZE_WRITES=tuned,
+            REST_FRAMEWORK=rest_framework,
+            LOAD_SHEDDING_MAX_INFLIGHT=0,
+        ):
+            self.set_journal_mode(journal_mode)
+            return self.run_clients(ids, options)
+
+    def run_clients(self, ids, options):
+        # Один обработчик запросов на всех клиентов, как в сервере
+        shared = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        shared.get("/api/v1/player/0/")
+        handler = shared.handler
+
+        latencies = []
+        error_kinds = Counter()
+        writes = errors = 0
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+
+        def worker(seed):
+            nonlocal writes, errors
+            rng = random.Random(seed)
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            client.handler = handler
+            local_latencies = []
+            local_errors = Counter()
+            local_writes = local_failed = 0
+            try:
+                while time.monotonic() < deadline:
+                    player_id = rng.choice(ids)
+                    write = rng.random() < options["write_ratio"]
+                    started = time.perf_counter()
+                    try:
+                        if write:
+                            response = client.post(
+                                f"/api/v1/player/{player_id}/increment/",
+                                {"own_money": 1},
+                                content_type="application/json",
+                            )
+                        else:
+                            response = client.get(f"/api/v1/player/{player_id}/")
+                    except Exception as exc:
+                        local_errors[f"{type(exc).__name__}: {exc}"[:80]] += 1
+                        local_failed += 1
+                        continue
+                    if response.status_code >= 400:
+                        local_errors[f"HTTP {response.status_code}"] += 1
+                        local_failed += 1
+                        continue
+                    local_latencies.append(time.perf_counter() - started)
+                    local_writes += write
+            finally:
+                connections[DEFAULT_DB_ALIAS].close()
+                with lock:
+                    latencies.extend(local_latencies)
+                    error_kinds.update(local_errors)
+                    writes += local_writes
+                    errors += local_failed
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, args=(seed,))
+            for seed in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        return {
+            "requests": len(latencies) + errors,
+            "rps": len(latencies) / elapsed,
+            "wps": writes / elapsed,
+            "errors": errors,
+            "p50": self.percentile(latencies, 0.5),
+            "p99": self.percentile(latencies, 0.99),
+            "error_kinds": error_kinds,
+        }
+
+    @staticmethod
+    def percentile(values, share):
+        if not values:
+            return 0
+        return values[min(int(len(values) * share), len(values) - 1)] * 1000
@@ -0,0 +1,99 @@
+import io
+import json
+import time
+
+from api.models import Player
+from api.renderers import MEDIA_TYPE, MessagePackParser, MessagePackRenderer
+from api.serializers import LeaderboardPlayerSerializer, PlayerSerializer
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+# Формат -> (рендерер, парсер, media type)
+WIRE_FORMATS = (
+    ("json", JSONRenderer, JSONParser, "application/json"),
+    ("msgpack", MessagePackRenderer, MessagePackParser, MEDIA_TYPE),
+    (
+        "msgpack-compact",
+        MessagePackRenderer,
+        MessagePackParser,
+        f"{MEDIA_TYPE}; keys=compact",
+    ),
+)
+
+
+def _timed(function, repeat):
+    # Лучшее время из нескольких прогонов меньше зависит от фоновой нагрузки
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Compare JSON and MessagePack payload size and encode/decode time"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--list-size",
+            type=int,
+            default=100,
+            help="Количество игроков в ответах со списком",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Количество прогонов замера"
+        )
+
+    def handle(self, *args, **options):
+        size = options["list_size"]
+        players = list(Player.objects.order_by("id")[:size])
+        if not players:
+            raise CommandError("No players found, run generateplayers first")
+
+        # Ответы собираются так же, как в представлениях, но без HTTP
+        payloads = {
+            "player": PlayerSerializer(players[0]).data,
+            "leaderboard": {
+                "total_players": Player.objects.count(),
+                "players_with_reviews": 0,
+                "average_review": 0,
+                "leaderboard": LeaderboardPlayerSerializer(
+                    Player.objects.order_by("-top_score")[:size], many=True
+                ).data,
+            },
+            "bulk-list": PlayerSerializer(players, many=True).data,
+        }
+
+        repeat = options["repeat"]
+        header = (
+            f"{'payload':<12} {'format':<16} {'bytes':>9} {'ratio':>6} "
+            f"{'encode ms':>10} {'decode ms':>10}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+
+        for name, data in payloads.items():
+            baseline = None
+            for label, renderer_class, parser_class, media_type in WIRE_FORMATS:
+                renderer, parser = renderer_class(), parser_class()
+
+                content = renderer.render(data, media_type)
+                encode = _timed(lambda: renderer.render(data, media_type), repeat)
+                decode = _timed(
+                    lambda: parser.parse(io.BytesIO(content), media_type), repeat
+                )
+
+                # Разбор должен восстанавливать исходный ответ
+                if json.loads(JSONRenderer().render(data)) != parser.parse(
+                    io.BytesIO(content), media_type
+                ):
+                    raise CommandError(f"{label} round trip changed {name} payload")
+
+                baseline = baseline or len(content)
+                self.stdout.write(
+                    f"{name:<12} {label:<16} {len(content):>9} "
+                    f"{len(content) / baseline:>6.2f} "
+                    f"{encode * 1000:>10.3f} {decode * 1000:>10.3f}"
+                )
@@ -0,0 +1,32 @@
+from api.schema import SchemaWarnings, build_schema_artifacts, schema_version
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Build versioned OpenAPI schema artifacts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory",
+            default=None,
+            help="Каталог для схем (по умолчанию SCHEMA_CACHE_DIR)",
+        )
+
+        parser.add_argument(
+            "--fail-on-warn",
+            action="store_true",
+            help="Завершиться ошибкой, если при генерации схемы были предупреждения",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            paths = build_schema_artifacts(
+                options["directory"], fail_on_warn=options["fail_on_warn"]
+            )
+        except SchemaWarnings as exc:
+            raise CommandError(str(exc))
+
+        for path in paths:
+            self.stdout.write(f"Written {path}")
+
+        self.stdout.write(self.style.SUCCESS(f"Schema version: {schema_version()}"))
@@ -0,0 +1,72 @@
+import gzip
+import sys
+import time
+
+from api.bulk import player_document, player_documents_queryset
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Command(BaseCommand):
+    help = "Export players with nested state to JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default="-",
+            help="Файл для записи, '-' - стандартный вывод",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Сжимать вывод (включается автоматически для *.gz)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Количество игроков, читаемых из курсора за раз",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        compress = options["gzip"] or path.endswith(".gz")
+
+        if path == "-":
+            output = sys.stdout.buffer
+            if compress:
+                output = gzip.GzipFile(fileobj=output, mode="wb")
+        elif compress:
+            output = gzip.open(path, "wb")
+        else:
+            output = open(path, "wb")
+
+        chunk_size = options["chunk_size"]
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        started = time.monotonic()
+        exported = 0
+
+        try:
+            # iterator() читает игроков через серверный курсор (на PostgreSQL),
+            # связанные записи подгружаются пачками по chunk_size
+            for player in player_documents_queryset().iterator(chunk_size=chunk_size):
+                output.write(encoder.encode(player_document(player)).encode())
+                output.write(b"\n")
+                exported += 1
+
+                if exported % chunk_size == 0:
+                    self._report(exported, started)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        self._report(exported, started, style=self.style.SUCCESS)
+
+    def _report(self, exported, started, style=None):
+        elapsed = time.monotonic() - started
+        message = (
+            f"Exported {exported} players in {elapsed:.1f}s "
+            f"({exported / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+        self.stderr.write(style(message) if style else message)
@@ -0,0 +1,145 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from api.bulk import bulk_create_players
+from api.models import Equipment, Harvest, Minigame
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+GENDERS = (("Male", 55), ("Female", 45))
+REVIEWS = ((1, 5), (2, 5), (3, 10), (4, 25), (5, 55))
+# Доля игроков, оставивших оценку
+REVIEW_RATE = 0.25
+# Вероятность получить достижение в пройденной мини-игре
+ACHIEVEMENT_RATE = 0.35
+
+
+def _choice(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def generate_document(rng, name, equipment, harvest, minigames):
+    """Случайный игрок с правдоподобным прогрессом по мини-играм."""
+    # Большинство игроков проходит одну-две игры, до конца доходят единицы
+    progress = min(int(rng.expovariate(0.7)), len(minigames))
+
+    minigame = {}
+    coins = 0
+    for index, game in enumerate(minigames):
+        complete = index < progress
+        score = int(rng.lognormvariate(4.5, 0.6)) if complete else 0
+        coins += score
+        minigame[game] = {
+            "available": index <= progress,
+            "complete": complete,
+            "score": score,
+            "achievement": complete and rng.random() < ACHIEVEMENT_RATE,
+        }
+
+    share = progress / len(minigames) if minigames else 0
+    own_coins = int(coins * rng.uniform(0.3, 1.0))
+
+    return {
+        "name": name,
+        "gender": _choice(rng, GENDERS),
+        "own_money": int(rng.lognormvariate(7, 1)),
+        "own_coins": own_coins,
+        "credit": rng.choice((0, 0, 0, 10000, 30000, 50000)),
+        "top_score": max(coins, own_coins),
+        "user_review": _choice(rng, REVIEWS) if rng.random() < REVIEW_RATE else None,
+        "equipment": {
+            item: {"available": rng.random() < share / (index + 1)}
+            for index, item in enumerate(equipment)
+        },
+        "harvest": {
+            item: {
+                "available": (available := index == 0 or rng.random() < share),
+                "harvest_amount": int(rng.expovariate(0.02)) if available else 0,
+                "gen_modified": available and rng.random() < share / 2,
+            }
+            for index, item in enumerate(harvest)
+        },
+        "minigame": minigame,
+    }
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic players for capacity testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("count", type=int, help="Количество игроков")
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Зерно генератора случайных чисел"
+        )
+        parser.add_argument(
+            "--prefix", default="bot_", help="Префикс имён создаваемых игроков"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Количество игроков в одной транзакции",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Количество параллельных потоков записи (для SQLite всегда 1)",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        chunk_size = options["chunk_size"]
+        prefix = options["prefix"]
+        width = len(str(max(count - 1, 0)))
+
+        if len(prefix) + width > 20:
+            raise CommandError("Prefix is too long for the player name field")
+
+        catalog = (
+            list(Equipment.objects.order_by("id").values_list("name", flat=True)),
+            list(Harvest.objects.order_by("id").values_list("name", flat=True)),
+            list(Minigame.objects.order_by("id").values_list("name", flat=True)),
+        )
+
+        workers = options["workers"]
+        if connection.vendor == "sqlite":
+            # SQLite допускает только одного писателя
+            workers = 1
+
+        def write_chunk(start):
+            # Генератор зависит только от зерна и номера пачки, поэтому
+            # результат не зависит от количества потоков
+            rng = random.Random(f"{options['seed']}:{start}")
+            documents = [
+                generate_document(rng, f"{prefix}{index:0{width}d}", *catalog)
+                for index in range(start, min(start + chunk_size, count))
+            ]
+            try:
+                with transaction.atomic():
+                    return len(documents), bulk_create_players(documents)
+            finally:
+                connections.close_all()
+
+        started = time.monotonic()
+        players = rows = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(write_chunk, start)
+                for start in range(0, count, chunk_size)
+            ]
+            for future in as_completed(futures):
+                created_players, created_rows = future.result()
+                players += created_players
+                rows += created_rows
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"Generated {players}/{count} players ({rows} rows) "
+                    f"in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Generated {players} players"))
@@ -0,0 +1,64 @@
+import heapq
+import time
+from collections import Counter
+
+from api.growth import evaluate
+from api.models import Player
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Current harvest totals and top players, computed without writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Количество игроков, рассчитываемых за один проход",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Сколько игроков с наибольшим урожаем вывести",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        totals = Counter()
+        top = []
+        players = 0
+
+        last_id = 0
+        while True:
+            ids = list(
+                Player.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[: options["chunk_size"]]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            players += len(ids)
+
+            for player_id, amounts in evaluate(ids).items():
+                totals.update(amounts)
+                heapq.heappush(top, (sum(amounts.values()), -player_id))
+                if len(top) > options["top"]:
+                    heapq.heappop(top)
+
+        for name, amount in sorted(totals.items()):
+            self.stdout.write(f"{name}: {amount}")
+        names = dict(
+            Player.objects.filter(
+                id__in=[-player_id for _, player_id in top]
+            ).values_list("id", "name")
+        )
+        for amount, player_id in sorted(top, reverse=True):
+            self.stdout.write(f"{names.get(-player_id, -player_id)}: {amount}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Evaluated {players} players in {elapsed:.1f}s")
+        )
@@ -0,0 +1,98 @@
+import gzip
+import json
+import sys
+import time
+from itertools import islice
+
+from api.backfill import THROUGH_MODELS
+from api.bulk import bulk_create_players
+from api.models import ArchivedPlayer, Player
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = "Import players with nested state from JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл для чтения, '-' - стандартный ввод")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Количество игроков в одной транзакции",
+        )
+        parser.add_argument(
+            "--keep-ids",
+            action="store_true",
+            help="Сохранять идентификаторы игроков из файла",
+        )
+        parser.add_argument(
+            "--skip-existing",
+            action="store_true",
+            help="Пропускать игроков, имена которых уже заняты",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+
+        if path == "-":
+            source = sys.stdin.buffer
+        elif path.endswith(".gz"):
+            source = gzip.open(path, "rb")
+        else:
+            source = open(path, "rb")
+
+        documents = (json.loads(line) for line in source if line.strip())
+        started = time.monotonic()
+        imported = skipped = rows = 0
+
+        try:
+            while chunk := list(islice(documents, options["chunk_size"])):
+                names = [document["name"] for document in chunk]
+                # Имена игроков в архиве тоже заняты
+                existing = set(
+                    Player.objects.filter(name__in=names).values_list("name", flat=True)
+                ) | set(
+                    ArchivedPlayer.objects.filter(name__in=names).values_list(
+                        "name", flat=True
+                    )
+                )
+                if existing and not options["skip_existing"]:
+                    raise CommandError(
+                        f"Players already exist: {', '.join(sorted(existing))}"
+                    )
+
+                chunk = [
+                    document for document in chunk if document["name"] not in existing
+                ]
+                skipped += len(existing)
+
+                with transaction.atomic():
+                    rows += bulk_create_players(chunk, keep_ids=options["keep_ids"])
+                imported += len(chunk)
+
+                self._report(imported, rows, started)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        if options["keep_ids"]:
+            # Сдвигаем последовательности после вставки с явными id
+            models = [Player, *(model for model, _, _ in THROUGH_MODELS)]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+        self._report(imported, rows, started, style=self.style.SUCCESS)
+        if skipped:
+            self.stderr.write(f"Skipped {skipped} existing players")
+
+    def _report(self, imported, rows, started, style=None):
+        elapsed = time.monotonic() - started
+        message = (
+            f"Imported {imported} players ({rows} rows) in {elapsed:.1f}s "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+        self.stderr.write(style(message) if style else message)
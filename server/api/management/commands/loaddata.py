@@ -1,69 +1,122 @@
 import json
 from pathlib import Path
 
-from api.models import Equipment, Harvest, Minigame
-from django.core.management.base import BaseCommand
+from api.backfill import backfill_achievements, backfill_player_rows
+from api.jobs import enqueue
+from api.models import Equipment, Harvest, Minigame, Player
+from django.core.management.base import BaseCommand, CommandError
 
 current_dir = Path(__file__).resolve().parent
 equipment_data_file = current_dir / "data/equipment_data.json"
 harvest_data_file = current_dir / "data/harvest_data.json"
 minigame_data_file = current_dir / "data/minigame_data.json"
 
+# Модель справочника -> (файл с данными, обновляемые поля, подпись для вывода)
+catalogs = (
+    (Equipment, equipment_data_file, ("description",), "Equipment"),
+    (Harvest, harvest_data_file, ("description", "growth_rate"), "Harvest"),
+    (Minigame, minigame_data_file, ("description", "achievement"), "Game"),
+)
+
 
 class Command(BaseCommand):
     help = "Load common data from JSON file"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Количество игроков, обрабатываемых в одной транзакции",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Пауза в секундах между транзакциями дозаполнения",
+        )
+        parser.add_argument(
+            "--async",
+            action="store_true",
+            dest="run_async",
+            help="Поставить дозаполнение в очередь фоновых задач (manage.py runjobs)",
+        )
+        parser.add_argument(
+            "--no-backfill",
+            action="store_true",
+            help="Не создавать недостающие записи у существующих игроков",
+        )
+
     def handle(self, *args, **options):
-        with open(equipment_data_file, "r") as file:
-            data = json.load(file)
+        for model, data_file, update_fields, label in catalogs:
+            with open(data_file, "r") as file:
+                data = json.load(file)
 
-        for item in data:
-            equipment, created = Equipment.objects.get_or_create(
-                name=item["name"], defaults={"description": item["description"]}
+            existing = set(
+                model.objects.filter(
+                    name__in=[item["name"] for item in data]
+                ).values_list("name", flat=True)
             )
 
-            if created:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Created Equipment: {equipment.name}")
-                )
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Equipment already exists: {equipment.name}")
-                )
+            model.objects.bulk_create(
+                [
+                    model(
+                        name=item["name"],
+                        **{field: item[field] for field in update_fields},
+                    )
+                    for item in data
+                ],
+                update_conflicts=True,
+                unique_fields=["name"],
+                update_fields=update_fields,
+            )
 
-        with open(harvest_data_file, "r") as file:
-            data = json.load(file)
+            for item in data:
+                if item["name"] in existing:
+                    message = f"Updated {label}: {item['name']}"
+                else:
+                    message = f"Created {label}: {item['name']}"
+                self.stdout.write(self.style.SUCCESS(message))
 
-        for item in data:
-            harvest, created = Harvest.objects.get_or_create(
-                name=item["name"], defaults={"description": item["description"]}
+        if Minigame.objects.filter(id__gt=Player.MAX_ACHIEVEMENT_MINIGAME_ID).exists():
+            raise CommandError(
+                "Minigame ids above "
+                f"{Player.MAX_ACHIEVEMENT_MINIGAME_ID} do not fit into achievement_mask"
             )
 
-            if created:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Created Harvest: {harvest.name}")
-                )
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Harvest already exists: {harvest.name}")
+        if options["no_backfill"]:
+            return
+
+        if options["run_async"]:
+            for name in ("backfill_player_rows", "backfill_achievements"):
+                job = enqueue(
+                    name, chunk_size=options["chunk_size"], pause=options["pause"]
                 )
+                self.stdout.write(self.style.SUCCESS(f"{name} queued as job #{job.id}"))
+            return
+
+        def progress(done, total, created):
+            self.stdout.write(
+                f"Backfill: {done}/{total} player ids, {created} rows created"
+            )
 
-        with open(minigame_data_file, "r") as file:
-            data = json.load(file)
+        created = backfill_player_rows(
+            chunk_size=options["chunk_size"],
+            pause=options["pause"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Backfill finished: {created} rows"))
 
-        for item in data:
-            game, created = Minigame.objects.get_or_create(
-                name=item["name"],
-                defaults={
-                    "description": item["description"],
-                    "achievement": item["achievement"],
-                },
+        def achievements_progress(done, total, updated):
+            self.stdout.write(
+                f"Achievements: {done}/{total} player ids, {updated} players fixed"
             )
 
-            if created:
-                self.stdout.write(self.style.SUCCESS(f"Created Game: {game.name}"))
-            else:
-                game.description = item["description"]
-                game.achievement = item["achievement"]
-                game.save()
-                self.stdout.write(self.style.SUCCESS(f"Updated Game: {game.name}"))
+        updated = backfill_achievements(
+            chunk_size=options["chunk_size"],
+            pause=options["pause"],
+            progress=achievements_progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Achievements backfill finished: {updated} players")
+        )
@@ -0,0 +1,78 @@
+import time
+from bisect import bisect_right
+
+from api.histogram import approximate_rank, load_histogram, rebuild_histogram
+from api.jobs import schedule_minigame_histograms
+from api.minigame_leaderboard import rebuild_minigame_histograms
+from api.models import Player
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the top_score and minigame histograms "
+        "and optionally verify approximate ranks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Сравнить приблизительные места с точными для всех игроков",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        counts = rebuild_histogram()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(counts)} buckets for {sum(counts.values())} players "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+        started = time.monotonic()
+        counts = rebuild_minigame_histograms()
+        # Дальше гистограммы мини-игр пересчитывает задача
+        schedule_minigame_histograms()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(counts)} minigame buckets "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+        if options["verify"]:
+            self.verify()
+
+    def verify(self):
+        # Точное место - 1 + количество игроков со строго большим счётом
+        scores = sorted(Player.objects.values_list("top_score", flat=True).iterator())
+        total = len(scores)
+        histogram = load_histogram()
+
+        errors = 0
+        max_error = 0
+        sum_error = 0
+        max_percentile_error = 0.0
+
+        for score in set(scores):
+            exact = total - bisect_right(scores, score) + 1
+            approx, bound, _ = approximate_rank(score, histogram)
+            error = abs(approx - exact)
+            players = bisect_right(scores, score) - bisect_right(scores, score - 1)
+
+            errors += players * (error > bound)
+            max_error = max(max_error, error)
+            sum_error += players * error
+            max_percentile_error = max(
+                max_percentile_error, error / max(total, 1) * 100
+            )
+
+        self.stdout.write(
+            f"Players: {total}, buckets: {len(histogram)}\n"
+            f"Mean rank error: {sum_error / max(total, 1):.1f}\n"
+            f"Max rank error: {max_error} "
+            f"({max_percentile_error:.3f} percentile points)\n"
+            f"Bound violations: {errors}"
+        )
@@ -0,0 +1,115 @@
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    BrokenExecutor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures import wait as wait_futures
+
+from api.jobs import claim_next, fail_job, run_job
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _close_connections():
+    # Процессы пула не должны использовать соединения, унаследованные от родителя
+    connections.close_all()
+
+
+def _run_job(job_id, owner):
+    try:
+        return job_id, run_job(job_id, owner)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2, help="Количество задач одновременно"
+        )
+        parser.add_argument(
+            "--mode",
+            choices=("thread", "process"),
+            default="thread",
+            help="Выполнять задачи в потоках или в отдельных процессах",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и завершиться",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда очередь пуста",
+        )
+
+    def make_executor(self, options):
+        if options["mode"] == "process":
+            _close_connections()
+            return ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_close_connections,
+            )
+        return ThreadPoolExecutor(max_workers=options["workers"])
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        executor = self.make_executor(options)
+
+        # Future -> (id задачи, владелец аренды), чтобы отметить задачу, если
+        # future упал
+        running = {}
+        try:
+            while True:
+                while len(running) < workers and (claimed := claim_next()):
+                    job_id, owner = claimed
+                    self.stdout.write(f"Started job #{job_id}")
+                    running[executor.submit(_run_job, job_id, owner)] = claimed
+
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                done, _ = wait_futures(
+                    running,
+                    timeout=options["poll_interval"],
+                    return_when=FIRST_COMPLETED,
+                )
+                broken = False
+                for future in done:
+                    job_id, owner = running.pop(future)
+                    try:
+                        _, status = future.result()
+                    except Exception as exc:
+                        # Процесс пула упал или задача не дошла до run_job
+                        status = fail_job(job_id, owner, traceback.format_exc())
+                        self.stderr.write(f"Job #{job_id} crashed: {exc!r}")
+                        broken = broken or isinstance(exc, BrokenExecutor)
+                    self.stdout.write(f"Finished job #{job_id}: {status}")
+
+                if broken:
+                    # Пул с упавшим процессом не принимает задачи, остальные
+                    # его задачи тоже завершатся ошибкой
+                    for future, (job_id, owner) in running.items():
+                        future.cancel()
+                        fail_job(
+                            job_id, owner, "Процесс пула задач завершился аварийно"
+                        )
+                    running = {}
+                    executor.shutdown(wait=False)
+                    executor = self.make_executor(options)
+        finally:
+            executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS("Job queue is empty"))
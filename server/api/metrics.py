@@ -0,0 +1,23 @@
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+_gauges = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def register_gauge(name, func):
+    """Значение gauge вычисляется функцией в момент снятия метрик."""
+    _gauges[name] = func
+
+
+def snapshot():
+    with _lock:
+        data = dict(_counters)
+    data.update({name: func() for name, func in _gauges.items()})
+    return data
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics
+from .profiling import RequestProfile, save_report
+from .sqlite import writer_lock
+
+
+class LoadSheddingMiddleware:
+    """
+    Ограничивает количество одновременно выполняемых пишущих запросов к API
+    в процессе. Сверх LOAD_SHEDDING_MAX_INFLIGHT запрос сразу получает 503 с
+    Retry-After, не доходя до базы данных.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = settings.LOAD_SHEDDING_MAX_INFLIGHT
+        self.inflight = 0
+        self.lock = threading.Lock()
+        metrics.register_gauge("load_shedding.inflight", lambda: self.inflight)
+
+    def __call__(self, request):
+        if (
+            self.limit <= 0
+            or request.method in SAFE_METHODS
+            or not request.path.startswith("/api/")
+        ):
+            return self.get_response(request)
+
+        with self.lock:
+            shed = self.inflight >= self.limit
+            if not shed:
+                self.inflight += 1
+
+        if shed:
+            metrics.increment("load_shedding.rejected")
+            response = JsonResponse(
+                {"detail": "Сервер перегружен, повторите запрос позже"}, status=503
+            )
+            response["Retry-After"] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+            return response
+
+        metrics.increment("load_shedding.accepted")
+        try:
+            return self.get_response(request)
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+
+class SQLiteWriterMiddleware:
+    """
+    Выполняет пишущие запросы к API по одному на базу SQLite. Без очереди
+    одновременные транзакции SQLite упираются в блокировку базы и ждут
+    busy_timeout или получают "database is locked". Длину очереди
+    ограничивает LoadSheddingMiddleware. С другими СУБД не подключается.
+    """
+
+    def __init__(self, get_response):
+        if (
+            connections[DEFAULT_DB_ALIAS].vendor != "sqlite"
+            or not settings.SQLITE_SERIALIZE_WRITES
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = writer_lock(DEFAULT_DB_ALIAS)
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS or not request.path.startswith("/api/"):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with self.lock:
+            metrics.increment("sqlite.writes")
+            metrics.increment(
+                "sqlite.writer_wait_ms", (time.perf_counter() - started) * 1000
+            )
+            return self.get_response(request)
+
+
+class RequestProfilerMiddleware:
+    """
+    Профилирует запрос сотрудника через cProfile, если передан заголовок
+    X-Profile: 1. Отчёт доступен по /api/v1/debug/profiles/<id>/, его id
+    возвращается в заголовке X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.headers.get("X-Profile") != "1" or not (
+            request.user.is_authenticated and request.user.is_staff
+        ):
+            return self.get_response(request)
+
+        request.profile = RequestProfile(request)
+        with request.profile:
+            response = self.get_response(request)
+
+        save_report(request.profile)
+        metrics.increment("profiler.requests")
+        response["X-Profile-Id"] = request.profile.id
+        response["Server-Timing"] = f"app;dur={request.profile.elapsed * 1000:.2f}"
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, "profile", None)
+        if profile is None:
+            return None
+
+        # Представление DRF и, для ViewSet, действие
+        view_class = getattr(view_func, "cls", None)
+        if view_class is None:
+            profile.view = view_func.__qualname__
+        else:
+            action = (getattr(view_func, "actions", None) or {}).get(
+                request.method.lower()
+            )
+            profile.view = ".".join(filter(None, (view_class.__name__, action)))
+        return None
@@ -0,0 +1,87 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .histogram import approximate_rank, bucket_of, load_histogram
+from .models import MinigameHistogramBucket, PlayerMinigame
+
+# Размер таблицы лидеров мини-игры
+LEADERBOARD_SIZE = 100
+
+
+def top_scores(minigame_id, limit=LEADERBOARD_SIZE):
+    """
+    Лучшие результаты мини-игры. Читается начало индекса
+    (minigame, -score, player), поэтому время не зависит от числа игроков.
+    """
+    return (
+        PlayerMinigame.objects.filter(minigame_id=minigame_id, score__gt=0)
+        .order_by("-score", "player_id")
+        .select_related("player")
+        .only("score", "player_id", "player__name")[:limit]
+    )
+
+
+def rebuild_minigame_histograms():
+    """
+    Пересчитывает гистограммы результатов всех мини-игр в корзинах
+    api.histogram одним GROUP BY и заменяет сохранённые корзины в одной
+    транзакции. Запускается задачей rebuild_minigame_histograms и при
+    развёртывании, запросы читают только сохранённый результат.
+    """
+    counts = Counter()
+    for minigame_id, score, count in (
+        PlayerMinigame.objects.values_list("minigame_id", "score")
+        .annotate(count=Count("id"))
+        .order_by()
+        .iterator()
+    ):
+        counts[minigame_id, bucket_of(score)] += count
+
+    with transaction.atomic():
+        MinigameHistogramBucket.objects.all().delete()
+        MinigameHistogramBucket.objects.bulk_create(
+            MinigameHistogramBucket(minigame_id=minigame_id, bucket=bucket, count=count)
+            for (minigame_id, bucket), count in counts.items()
+        )
+    return counts
+
+
+def minigame_histogram(minigame_id):
+    """Сохранённая гистограмма результатов мини-игры: {корзина: игроков}."""
+    return dict(
+        MinigameHistogramBucket.objects.filter(minigame_id=minigame_id).values_list(
+            "bucket", "count"
+        )
+    )
+
+
+def player_rank(minigame_id, score):
+    """
+    Место результата score в мини-игре: (место, погрешность, всего игроков).
+
+    Игроки с большим счётом считаются по индексу, но не дальше
+    MINIGAME_EXACT_RANK_LIMIT строк. Если их больше, место оценивается по
+    сохранённой гистограмме мини-игры, как в /liderboard/{id}/percentile/.
+    Она обновляется раз в MINIGAME_HISTOGRAM_INTERVAL секунд, поэтому для
+    точного места не читается: у каждого игрока есть запись PlayerMinigame, и
+    количество игроков берётся из гистограммы top_score, которая ведётся
+    постоянно.
+    """
+    limit = settings.MINIGAME_EXACT_RANK_LIMIT
+    above = (
+        PlayerMinigame.objects.filter(minigame_id=minigame_id, score__gt=score)
+        .order_by()[:limit]
+        .count()
+    )
+    if above < limit:
+        total = sum(load_histogram().values())
+        return above + 1, 0, max(total, above + 1)
+
+    place, rank_error, total = approximate_rank(score, minigame_histogram(minigame_id))
+    # Оценка не может оказаться выше уже посчитанных игроков, а гистограмма
+    # могла отстать от них
+    place = max(place, limit + 1)
+    return place, rank_error, max(total, place)
@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models import Case, Exists, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.lookups import Exact
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .histogram import record_score_change
+from .models import Minigame, Player, PlayerMinigame
+
+MINIGAME_FIELDS = ("available", "complete", "score", "achievement")
+
+
+class MinigameLocked(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Мини-игра ещё не открыта для игрока"
+    default_code = "minigame_locked"
+
+
+def opening_minigame_id():
+    """
+    Первая мини-игра справочника: она открыта игроку с начала игры, остальные
+    открываются прохождением предыдущей.
+    """
+    return Minigame.objects.order_by("id").values_list("id", flat=True).first()
+
+
+def resolve_minigame(lookup):
+    """
+    Мини-игра по имени или идентификатору и следующая за ней по порядку
+    справочника: ((id, имя), (id, имя) или None). Один запрос к справочнику.
+    """
+    catalog = list(Minigame.objects.order_by("id").values_list("id", "name"))
+    for index, (minigame_id, name) in enumerate(catalog):
+        if name == lookup or str(minigame_id) == str(lookup):
+            following = catalog[index + 1] if index + 1 < len(catalog) else None
+            return (minigame_id, name), following
+    raise Minigame.DoesNotExist
+
+
+def submit_result(player_id, minigame, following, score, complete, achievement, coins):
+    """
+    Записывает результат мини-игры за постоянное число запросов: лучший счёт,
+    прохождение и достижение в PlayerMinigame, открытие следующей игры,
+    начисление coins в own_coins с подъёмом top_score, маску и счётчик
+    достижений. Прохождение и достижение не снимаются.
+
+    Возвращает изменённые поля или None, если игрок не найден. Результат
+    закрытой для игрока мини-игры не принимается: MinigameLocked. Первая
+    мини-игра справочника открыта всегда, в том числе у игроков, созданных до
+    её открытия при создании.
+    """
+    minigame_id, _ = minigame
+    with transaction.atomic():
+        # Блокировка игрока упорядочивает одновременные результаты, прежний
+        # top_score нужен гистограмме счёта
+        old_top_score = (
+            Player.objects.select_for_update()
+            .filter(pk=player_id)
+            .values_list("top_score", flat=True)
+            .first()
+        )
+        if old_top_score is None:
+            return None
+
+        minigame_changes = {"available": True, "score": Greatest("score", Value(score))}
+        if complete:
+            minigame_changes["complete"] = True
+        if achievement:
+            minigame_changes["achievement"] = True
+        opening = ~Exists(Minigame.objects.filter(id__lt=minigame_id))
+        played = (
+            PlayerMinigame.objects.filter(player_id=player_id, minigame_id=minigame_id)
+            .filter(Q(available=True) | opening)
+            .update(**minigame_changes)
+        )
+        if not played:
+            raise MinigameLocked
+
+        unlocked = complete and following is not None
+        if unlocked:
+            PlayerMinigame.objects.filter(
+                player_id=player_id, minigame_id=following[0]
+            ).update(available=True)
+
+        sections = ["minigame"]
+        player_changes = {}
+        if coins:
+            sections.append("wallet")
+            player_changes["own_coins"] = F("own_coins") + coins
+            player_changes["top_score"] = Greatest("top_score", F("own_coins") + coins)
+        if achievement:
+            bit = Player.achievement_bit(minigame_id)
+            # Счётчик растёт, только если бита ещё не было в маске
+            player_changes["achievement_count"] = F("achievement_count") + Case(
+                When(Exact(F("achievement_mask").bitand(bit), 0), then=Value(1)),
+                default=Value(0),
+            )
+            player_changes["achievement_mask"] = F("achievement_mask").bitor(bit)
+        Player.objects.filter(pk=player_id).update(
+            **player_changes, **Player.version_changes(*sections)
+        )
+
+        changed = (
+            Player.objects.filter(pk=player_id)
+            .values("id", "version", "own_coins", "top_score", "achievement_count")
+            .get()
+        )
+        rows = PlayerMinigame.objects.filter(
+            player_id=player_id,
+            minigame_id__in=[minigame_id, following[0]] if unlocked else [minigame_id],
+        ).values_list("minigame_name", *MINIGAME_FIELDS)
+        changed["minigame"] = {
+            name: dict(zip(MINIGAME_FIELDS, values)) for name, *values in rows
+        }
+
+    record_score_change(old_top_score, changed["top_score"])
+    return changed
@@ -1,5 +1,7 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connection, models
+from django.utils import timezone
 
 
 class Equipment(models.Model):
@@ -17,6 +19,8 @@ class Equipment(models.Model):
 class Harvest(models.Model):
     name = models.CharField(max_length=50, blank=False, unique=True)
     description = models.TextField()
+    # Прирост урожая в единицах в час, если у игрока не задан свой
+    growth_rate = models.FloatField(default=0)
 
     def __str__(self):
         return f"{self.name}"
@@ -39,8 +43,27 @@ class Minigame(models.Model):
         verbose_name_plural = "Игры"
 
 
+class PlayerQuerySet(models.QuerySet):
+    def name_prefix(self, prefix):
+        """Поиск по началу имени, использующий индекс на Player.name."""
+        if connection.vendor == "postgresql":
+            # LIKE 'prefix%' обслуживается индексом varchar_pattern_ops,
+            # который PostgreSQL создаёт для уникального CharField
+            return self.filter(name__startswith=prefix)
+
+        # В остальных СУБД LIKE не использует индекс, поэтому ищем диапазоном
+        return self.filter(name__gte=prefix, name__lt=prefix + "\U0010ffff")
+
+    def bump_versions(self, *sections):
+        """Увеличивает версию игроков и отмечает ею изменённые разделы."""
+        return self.update(**Player.version_changes(*sections))
+
+
 class Player(models.Model):
     genders = (("Male", "Мужчина"), ("Female", "Женщина"), (None, "Не указан"))
+    # Разделы документа игрока с собственной версией для синхронизации
+    SYNC_SECTIONS = ("profile", "wallet", "equipment", "harvest", "minigame")
+    VERSION_FIELDS = ("version", *(f"{section}_version" for section in SYNC_SECTIONS))
 
     name = models.CharField(max_length=20, blank=False, unique=True)
     gender = models.CharField(max_length=9, choices=genders, default="Male")
@@ -49,6 +72,20 @@ class Player(models.Model):
     credit = models.IntegerField(default=0)
     top_score = models.IntegerField(default=0)
 
+    # Денормализованные достижения: бит (minigame.id - 1) выставлен,
+    # если достижение мини-игры получено
+    achievement_mask = models.BigIntegerField(default=0)
+    achievement_count = models.IntegerField(default=0)
+
+    # Номер последнего изменения игрока и номера изменений, в которых
+    # последний раз менялся каждый раздел. Меняются только bump_versions
+    version = models.IntegerField(default=0)
+    profile_version = models.IntegerField(default=0)
+    wallet_version = models.IntegerField(default=0)
+    equipment_version = models.IntegerField(default=0)
+    harvest_version = models.IntegerField(default=0)
+    minigame_version = models.IntegerField(default=0)
+
     user_review = models.IntegerField(
         null=True,
         blank=True,
@@ -56,18 +93,137 @@ class Player(models.Model):
         choices=[(1, "1"), (2, "2"), (3, "3"), (4, "4"), (5, "5")],
     )
 
+    # Время последнего обращения игрока, с точностью PLAYER_ACTIVITY_INTERVAL.
+    # Давно неактивные игроки переносятся в ArchivedPlayer (api.archive)
+    last_active = models.DateTimeField(default=timezone.now, db_index=True)
+
     equipment = models.ManyToManyField(Equipment, through="PlayerEquipment")
     harvest = models.ManyToManyField(Harvest, through="PlayerHarvest")
     minigame = models.ManyToManyField(Minigame, through="PlayerMinigame")
 
+    objects = PlayerQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД нужны save, чтобы записывать только изменённые поля
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if hasattr(self, "_loaded_values"):
+            for field in self._meta.concrete_fields:
+                if field.attname in self.__dict__ and (
+                    fields is None or field.name in fields or field.attname in fields
+                ):
+                    self._loaded_values[field.attname] = getattr(self, field.attname)
+
+    def changed_fields(self):
+        """
+        Поля, изменённые после загрузки из БД. Версии меняет только
+        bump_versions, поэтому они сюда не попадают.
+        """
+        loaded = getattr(self, "_loaded_values", {})
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.VERSION_FIELDS
+            and field.attname in self.__dict__
+            and (
+                field.attname not in loaded
+                or loaded[field.attname] != getattr(self, field.attname)
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        # Сохранение загруженного ранее игрока записывает только изменённые
+        # поля: полная запись строки откатывала бы монеты и версии, изменённые
+        # параллельными запросами
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = self.changed_fields()
+        super().save(*args, **kwargs)
+        saved = kwargs.get("update_fields")
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (
+                saved is None or field.name in saved
+            ):
+                loaded[field.attname] = getattr(self, field.attname)
+
+    @staticmethod
+    def version_changes(*sections):
+        """
+        Значения для UPDATE: следующая версия игрока и её номер у разделов.
+        В UPDATE правая часть видит прежние значения, поэтому все поля
+        получают одно и то же число.
+        """
+        next_version = models.F("version") + 1
+        return {
+            "version": next_version,
+            **{f"{section}_version": next_version for section in sections},
+        }
+
+    # Старший бит знаковый, поэтому в BigIntegerField помещаются мини-игры
+    # с id от 1 до 63
+    MAX_ACHIEVEMENT_MINIGAME_ID = 63
+
+    @classmethod
+    def achievement_bit(cls, minigame_id):
+        if not 1 <= minigame_id <= cls.MAX_ACHIEVEMENT_MINIGAME_ID:
+            raise ValueError(
+                f"Minigame id {minigame_id} does not fit into achievement_mask "
+                f"(1..{cls.MAX_ACHIEVEMENT_MINIGAME_ID})"
+            )
+        return 1 << (minigame_id - 1)
+
+    def refresh_achievements(self, save=True):
+        """Пересчитывает битовую маску и счётчик достижений по PlayerMinigame."""
+        mask = 0
+        for minigame_id in PlayerMinigame.objects.filter(
+            player=self, achievement=True
+        ).values_list("minigame_id", flat=True):
+            mask |= self.achievement_bit(minigame_id)
+
+        self.achievement_mask = mask
+        self.achievement_count = bin(mask).count("1")
+
+        if save:
+            self.save(update_fields=["achievement_mask", "achievement_count"])
+
     class Meta:
         verbose_name = "Игрок"
         verbose_name_plural = "Игроки"
 
 
+class ArchivedPlayer(models.Model):
+    """
+    Неактивный игрок в холодном хранении: весь документ игрока вместе со
+    связанными записями в одном поле JSON. Имя остаётся занятым, при
+    обращении к игроку он восстанавливается с тем же id.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=20, unique=True)
+    # Копии полей документа для статистики без разбора JSON
+    top_score = models.IntegerField(default=0)
+    user_review = models.IntegerField(null=True, blank=True)
+    document = models.JSONField(encoder=DjangoJSONEncoder)
+    last_active = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name}"
+
+    class Meta:
+        verbose_name = "Архивный игрок"
+        verbose_name_plural = "Архивные игроки"
+
+
 class PlayerEquipment(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE)
@@ -82,9 +238,13 @@ class PlayerHarvest(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     harvest = models.ForeignKey(Harvest, on_delete=models.CASCADE)
     harvest_name = models.CharField(max_length=50, blank=False)
+    # Количество на момент last_tick; текущее вычисляет api.growth
     harvest_amount = models.IntegerField(default=0)
     available = models.BooleanField(default=False)
     gen_modified = models.BooleanField(default=False)
+    # Свой прирост игрока в единицах в час, None - прирост из справочника
+    growth_rate = models.FloatField(null=True, blank=True)
+    last_tick = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return (
@@ -111,3 +271,95 @@ class PlayerMinigame(models.Model):
             f"complete: {self.complete},"
             f"score: {self.score}"
         )
+
+    class Meta:
+        indexes = [
+            # Таблицы лидеров мини-игр (api.minigame_leaderboard)
+            models.Index(
+                fields=["minigame", "-score", "player"],
+                name="api_pm_minigame_score_idx",
+            )
+        ]
+
+
+class ScoreEvent(models.Model):
+    # Очередь необработанных событий без внешних ключей и вторичных индексов:
+    # агрегатор читает её по возрастанию первичного ключа и удаляет учтённые
+    # события в той же транзакции
+    player_id = models.BigIntegerField()
+    minigame_id = models.BigIntegerField(null=True)
+    score = models.IntegerField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Событие счёта"
+        verbose_name_plural = "События счёта"
+
+
+class ScoreAggregatorState(models.Model):
+    # Строка состояния блокируется на время пачки, чтобы агрегаторы не
+    # работали одновременно. last_event_id - последнее учтённое событие
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_event_id}"
+
+
+class Job(models.Model):
+    statuses = (
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Выполнено"),
+        ("failed", "Ошибка"),
+    )
+
+    name = models.CharField(max_length=50)
+    # Ключ идемпотентности: повторная постановка с тем же ключом не создаёт задачу
+    key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=statuses, default="pending")
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    progress = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Аренда выполняющейся задачи: воркер продлевает её, пока жив. Задачу
+    # с истёкшей арендой снова забирает claim_next
+    locked_until = models.DateTimeField(null=True, blank=True)
+    # Владелец аренды (api.jobs.lease_owner): итог задачи записывает только он
+    locked_by = models.CharField(max_length=100, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.id}: {self.status}"
+
+    class Meta:
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+
+class ScoreHistogramBucket(models.Model):
+    # Количество игроков, чей top_score попадает в корзину (см. api.histogram)
+    bucket = models.IntegerField(unique=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.bucket}: {self.count}"
+
+
+class MinigameHistogramBucket(models.Model):
+    # Количество игроков с результатом мини-игры в корзине (см. api.histogram).
+    # Таблица пересчитывается целиком задачей rebuild_minigame_histograms
+    minigame = models.ForeignKey(Minigame, on_delete=models.CASCADE)
+    bucket = models.IntegerField()
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.minigame_id}/{self.bucket}: {self.count}"
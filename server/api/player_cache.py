@@ -0,0 +1,140 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import metrics
+from .events import publish_player
+from .models import Player
+from .serializers import PlayerSerializer
+
+# Поколение сбрасывает документы всех игроков сразу, например после
+# добавления элементов справочника
+GENERATION_KEY = "player-cache:generation"
+
+
+def get_cache():
+    return caches[settings.PLAYER_CACHE_ALIAS]
+
+
+def version_key(player_id):
+    return f"player-cache:version:{player_id}"
+
+
+def document_key(player_id, generation, version):
+    return f"player-cache:{player_id}:{generation}:{version}"
+
+
+def _initial_version():
+    # Версия, выданная после вытеснения ключа из кэша, не совпадает ни с
+    # одной прежней, поэтому старый документ уже не будет прочитан
+    return time.time_ns()
+
+
+def _get_or_init(cache, key):
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial_version(), None)
+        value = cache.get(key)
+    return value
+
+
+def current_key(player_id):
+    """Ключ актуального документа игрока."""
+    cache = get_cache()
+    keys = (GENERATION_KEY, version_key(player_id))
+    values = cache.get_many(keys)
+    generation, version = (values.get(key) or _get_or_init(cache, key) for key in keys)
+    return document_key(player_id, generation, version)
+
+
+def get_player_document(player_id, build):
+    """
+    Документ игрока из кэша. При промахе он собирается функцией build.
+    Ключ определяется до чтения из БД: если во время сборки игрок изменится,
+    документ попадёт под устаревшую версию и больше не будет прочитан.
+    """
+    cache = get_cache()
+    key = current_key(player_id)
+
+    document = cache.get(key)
+    if document is not None:
+        metrics.increment("player_cache.hit")
+        return document
+
+    metrics.increment("player_cache.miss")
+    document = build()
+    cache.add(key, dict(document), settings.PLAYER_CACHE_TIMEOUT)
+    return document
+
+
+def build_player_document(player_id):
+    """Документ игрока из основной БД или None, если игрока нет."""
+    player = Player.objects.using(DEFAULT_DB_ALIAS).filter(pk=player_id).first()
+    if player is None:
+        return None
+    return PlayerSerializer(player).data
+
+
+def _bump_version(cache, player_id):
+    try:
+        return cache.incr(version_key(player_id))
+    except ValueError:
+        return _get_or_init(cache, version_key(player_id))
+
+
+def refresh_player(player_id):
+    """
+    После фиксации транзакции переводит игрока на новую версию и сразу
+    кладёт в кэш свежий документ. Документ собирается уже после смены
+    версии, поэтому он не старше записи. Подписчики игрока получают событие
+    с его новой версией.
+    """
+
+    def refresh():
+        cache = get_cache()
+        # Ключ берётся по версии, полученной этим вызовом: более поздняя
+        # запись получит следующую версию и свой ключ
+        key = document_key(
+            player_id,
+            _get_or_init(cache, GENERATION_KEY),
+            _bump_version(cache, player_id),
+        )
+        metrics.increment("player_cache.refresh")
+
+        document = build_player_document(player_id)
+        if document is not None:
+            # set, а не add: перекрывает документ, который параллельный
+            # промах мог успеть собрать с отстающей реплики
+            cache.set(key, dict(document), settings.PLAYER_CACHE_TIMEOUT)
+            publish_player(player_id, document["version"])
+
+    transaction.on_commit(refresh)
+
+
+def invalidate_players(player_ids):
+    """
+    Сбрасывает документы игроков после фиксации транзакции и сообщает
+    подписчикам об их изменении.
+    """
+    player_ids = list(player_ids)
+
+    def invalidate():
+        get_cache().delete_many([version_key(player_id) for player_id in player_ids])
+        metrics.increment("player_cache.invalidate", len(player_ids))
+        for player_id in player_ids:
+            publish_player(player_id)
+
+    if player_ids:
+        transaction.on_commit(invalidate)
+
+
+def invalidate_all():
+    """Сбрасывает документы всех игроков после фиксации транзакции."""
+
+    def invalidate():
+        get_cache().set(GENERATION_KEY, _initial_version(), None)
+        metrics.increment("player_cache.invalidate_all")
+
+    transaction.on_commit(invalidate)
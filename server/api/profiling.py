@@ -0,0 +1,187 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+
+# Одновременно работает только один сэмплер на процесс
+_sampling = threading.Lock()
+_reports_lock = threading.Lock()
+_reports = OrderedDict()
+
+# Категории для распределения собственного времени функций по запросу:
+# (категория, фрагмент пути к файлу)
+CATEGORIES = (
+    ("serializers", f"rest_framework{os.sep}serializers.py"),
+    ("serializers", f"rest_framework{os.sep}fields.py"),
+    ("serializers", f"api{os.sep}serializers.py"),
+    ("views", f"api{os.sep}views{os.sep}"),
+    ("drf", f"{os.sep}rest_framework{os.sep}"),
+    ("db", f"django{os.sep}db{os.sep}"),
+    ("django", f"{os.sep}django{os.sep}"),
+    ("api", f"{os.sep}api{os.sep}"),
+)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _short_path(filename):
+    """Путь относительно sys.path, как имя модуля в стеке."""
+    best = filename
+    for entry in sys.path:
+        # Пустая строка в sys.path означает текущий каталог
+        entry = entry or os.getcwd()
+        if filename.startswith(entry) and len(entry) < len(filename):
+            relative = filename[len(entry) :].lstrip(os.sep)
+            if len(relative) < len(best):
+                best = relative
+    return best
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval):
+    """
+    Снимает стеки всех потоков процесса, кроме текущего, каждые interval
+    секунд в течение seconds секунд. Возвращает Counter свёрнутых стеков
+    "внешний;...;внутренний" -> количество попаданий.
+    """
+    if not _sampling.acquire(blocking=False):
+        raise ProfilerBusy
+
+    try:
+        current = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        labels = {}
+        stacks = Counter()
+
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == current:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+
+        return stacks
+    finally:
+        _sampling.release()
+
+
+def collapse(stacks):
+    """Формат collapsed stacks для flamegraph.pl и speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _category(filename):
+    for category, fragment in CATEGORIES:
+        if fragment in filename:
+            return category
+    return "other"
+
+
+class RequestProfile:
+    """Детерминированный профиль одного запроса через cProfile."""
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.method = request.method
+        self.path = request.get_full_path()
+        self.created = time.time()
+        self.profiler = cProfile.Profile()
+        self.elapsed = 0
+        self.view = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "view": self.view,
+            "elapsed_ms": round(self.elapsed * 1000, 2),
+            "created": self.created,
+        }
+
+    def report(self, limit=40):
+        """
+        Текстовый отчёт: собственное время по категориям (представления DRF,
+        сериализаторы, ORM...), кумулятивное время функций проекта и общий
+        список pstats.
+        """
+        stats = pstats.Stats(self.profiler)
+        totals = defaultdict(float)
+        project = []
+        for (filename, lineno, name), (
+            _,
+            calls,
+            tottime,
+            cumtime,
+            _,
+        ) in stats.stats.items():
+            totals[_category(filename)] += tottime
+            if _category(filename) in ("views", "serializers", "api"):
+                project.append(
+                    (cumtime, calls, f"{_short_path(filename)}:{lineno}({name})")
+                )
+
+        out = io.StringIO()
+        out.write(f"{self.method} {self.path}\n")
+        out.write(f"view: {self.view}\nelapsed: {self.elapsed * 1000:.2f} ms\n\n")
+
+        out.write("Own time by category\n")
+        for category, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+            out.write(f"  {category:<12} {seconds * 1000:10.2f} ms\n")
+
+        out.write("\nProject functions by cumulative time\n")
+        for cumtime, calls, label in sorted(project, reverse=True)[:limit]:
+            out.write(f"  {cumtime * 1000:10.2f} ms {calls:8d}  {label}\n")
+
+        out.write("\n")
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def save_report(profile):
+    with _reports_lock:
+        _reports[profile.id] = profile
+        while len(_reports) > settings.PROFILER_KEEP_REPORTS:
+            _reports.popitem(last=False)
+
+
+def get_report(profile_id):
+    with _reports_lock:
+        return _reports.get(profile_id)
+
+
+def list_reports():
+    with _reports_lock:
+        return [profile.summary() for profile in reversed(_reports.values())]
@@ -0,0 +1,212 @@
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_fingerprints = {}
+_slow = deque(maxlen=settings.QUERYLOG_KEEP_SLOW)
+# Запросы самого журнала (EXPLAIN) не учитываются
+_local = threading.local()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACES = re.compile(r"\s+")
+_CALL = re.compile(r"\b(\w+)\s*\(")
+# Ключевые слова и функции без побочных эффектов, за которыми в SELECT может
+# идти "(". Запрос с любым другим вызовом (pg_notify, nextval, setval...)
+# EXPLAIN ANALYZE выполнил бы повторно вместе с побочными эффектами
+READ_ONLY_CALLS = frozenset(
+    (
+        "select from where and or not in on as by join using lateral exists any "
+        "all values case when then else having filter over union intersect "
+        "except between like ilike is distinct interval "
+        "count sum min max avg coalesce nullif greatest least cast lower upper "
+        "abs length round floor ceil extract date_trunc now row_number rank "
+        "dense_rank array_agg string_agg bool_and bool_or json_build_object "
+        "jsonb_build_object similarity word_similarity strict_word_similarity"
+    ).split()
+)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Нормализованный текст запроса: литералы заменены на ?, списки
+    параметров IN (...) любой длины свёрнуты в один.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _PLACEHOLDERS.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def origin_stack():
+    """
+    Кадры кода проекта, из которых выполнен запрос: представление,
+    сериализатор, сигнал.
+    """
+    base = str(settings.BASE_DIR)
+    return [
+        f"{frame.filename[len(base) :].lstrip('/')}:{frame.lineno}({frame.name})"
+        for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(base) and "site-packages" not in frame.filename
+    ]
+
+
+def read_only(sql):
+    """
+    SELECT без блокировок строк, вызывающий только функции из
+    READ_ONLY_CALLS: его можно выполнить повторно в EXPLAIN ANALYZE.
+    """
+    sql = _STRING.sub("?", sql)
+    return " FOR UPDATE" not in sql.upper() and all(
+        name.lower() in READ_ONLY_CALLS for name in _CALL.findall(sql)
+    )
+
+
+def explain(connection, sql, params, analyze=False):
+    """
+    План выполнения запроса. С analyze - EXPLAIN ANALYZE с фактическим
+    временем: он выполняет запрос повторно, поэтому используется только для
+    read_only запросов. Выполняется в точке сохранения, чтобы ошибка не
+    прервала транзакцию запроса.
+    """
+    options = " (ANALYZE, BUFFERS)" if analyze else ""
+    _local.active = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN{options} {sql}", params)
+                return "\n".join(row[0] for row in cursor.fetchall())
+    except DatabaseError as exc:
+        return f"EXPLAIN failed: {exc}"
+    finally:
+        _local.active = False
+
+
+def should_explain(connection, sql, many):
+    return (
+        connection.vendor == "postgresql"
+        and not many
+        and sql.lstrip()[:6].upper() == "SELECT"
+        and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+    )
+
+
+def record(sql, duration, slow=None):
+    key = fingerprint(sql)
+    with _lock:
+        entry = _fingerprints.get(key)
+        if entry is None:
+            if len(_fingerprints) >= settings.QUERYLOG_MAX_FINGERPRINTS:
+                metrics.increment("db.fingerprints_dropped")
+                return
+            entry = _fingerprints[key] = {
+                "fingerprint": key,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "slow": 0,
+                "plan": None,
+            }
+        entry["count"] += 1
+        entry["total_ms"] += duration
+        entry["max_ms"] = max(entry["max_ms"], duration)
+        if slow is not None:
+            entry["slow"] += 1
+            if slow["plan"] is not None:
+                entry["plan"] = slow["plan"]
+            _slow.append({"fingerprint": key, **slow})
+
+
+class QueryLogger:
+    """
+    Обёртка выполнения запросов (connection.execute_wrapper): собирает
+    количество и время по нормализованным запросам, а запросы дольше
+    SLOW_QUERY_MS пишет в лог вместе с вызвавшим их кодом проекта.
+    """
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, "active", False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = execute(sql, params, many, context)
+            failed = False
+            return result
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            metrics.increment("db.queries")
+            slow = None
+            if duration >= settings.SLOW_QUERY_MS:
+                slow = self.slow_query(sql, params, many, context, duration, failed)
+            record(sql, duration, slow)
+
+    def slow_query(self, sql, params, many, context, duration, failed):
+        connection = context["connection"]
+        stack = origin_stack()
+        metrics.increment("db.slow_queries")
+        logger.warning(
+            "Slow query %.1f ms on %s: %s\n  at %s",
+            duration,
+            connection.alias,
+            sql,
+            "\n  at ".join(reversed(stack)) or "-",
+        )
+
+        plan = None
+        # После ошибки транзакция запроса уже прервана
+        if not failed and should_explain(connection, sql, many):
+            plan = explain(connection, sql, params, analyze=read_only(sql))
+        return {
+            "sql": sql,
+            "duration_ms": round(duration, 2),
+            "database": connection.alias,
+            "stack": stack,
+            "plan": plan,
+            "time": time.time(),
+        }
+
+
+def install(connection):
+    """Подключает журнал к соединению, если он ещё не подключён."""
+    if not any(
+        isinstance(wrapper, QueryLogger) for wrapper in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(QueryLogger())
+
+
+def report(limit=50):
+    with _lock:
+        fingerprints = sorted(
+            (dict(entry) for entry in _fingerprints.values()),
+            key=lambda entry: -entry["total_ms"],
+        )[:limit]
+        slow = list(reversed(_slow))
+    for entry in fingerprints:
+        entry["total_ms"] = round(entry["total_ms"], 2)
+        entry["max_ms"] = round(entry["max_ms"], 2)
+        entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 2)
+    return {"fingerprints": fingerprints, "slow": slow}
+
+
+def reset():
+    with _lock:
+        _fingerprints.clear()
+        _slow.clear()
@@ -0,0 +1,141 @@
+import msgpack
+from django.utils.http import parse_header_parameters
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+MEDIA_TYPE = "application/msgpack"
+
+# Короткие ключи для компактного режима (Accept/Content-Type с параметром
+# keys=compact). Коды только добавляются: изменение существующего кода
+# ломает уже выпущенных клиентов.
+COMPACT_KEYS = {
+    "id": "i",
+    "name": "n",
+    "gender": "g",
+    "own_money": "om",
+    "own_coins": "oc",
+    "user_review": "ur",
+    "credit": "cr",
+    "top_score": "ts",
+    "equipment": "e",
+    "harvest": "h",
+    "minigame": "m",
+    "equipment_name": "en",
+    "harvest_name": "hn",
+    "minigame_name": "mn",
+    "available": "a",
+    "harvest_amount": "ha",
+    "gen_modified": "gm",
+    "complete": "c",
+    "score": "s",
+    "achievement": "ac",
+    "achievement_count": "acc",
+    "description": "d",
+    "total_players": "tp",
+    "players_with_reviews": "pr",
+    "average_review": "ar",
+    "leaderboard": "lb",
+    "liderdoard": "ld",
+    "player_id": "pi",
+    "player_name": "pn",
+    "place": "p",
+    "rank_error": "re",
+    "top_percent": "tpc",
+    "count": "cn",
+    "next": "nx",
+    "previous": "pv",
+    "results": "r",
+    "detail": "dt",
+    "base_amount": "ba",
+    "growth_rate": "gr",
+    "last_tick": "lt",
+    "version": "v",
+    "liderboard": "lbd",
+    "coins": "co",
+    "inc": "in",
+    "timestamp": "tm",
+    "accepted": "acp",
+    "error": "er",
+    "activeUsersNum": "au",
+    "avgMark": "am",
+}
+EXPANDED_KEYS = {code: key for key, code in COMPACT_KEYS.items()}
+
+# Поля-словари, ключи которых - данные (имена элементов справочников),
+# а не имена полей: {"equipment": {"robot": {...}}}. Такие ключи не
+# заменяются, иначе элемент с именем вроде "score" стал бы "s"
+DATA_MAPS = {"equipment", "harvest", "minigame", "achievement"}
+
+
+def translate_keys(data, keys):
+    """
+    Рекурсивно заменяет по таблице keys имена полей. Ключи словарей из
+    DATA_MAPS остаются как есть, заменяются только поля их элементов.
+    """
+    if isinstance(data, dict):
+        translated = {}
+        for key, value in data.items():
+            name = keys.get(key, key)
+            # В одну сторону полное имя - key, в обратную - name
+            if isinstance(value, dict) and (key in DATA_MAPS or name in DATA_MAPS):
+                value = {
+                    item: translate_keys(fields, keys) for item, fields in value.items()
+                }
+            else:
+                value = translate_keys(value, keys)
+            translated[name] = value
+        return translated
+    if isinstance(data, (list, tuple)):
+        return [translate_keys(item, keys) for item in data]
+    return data
+
+
+def is_compact(media_type):
+    if not media_type:
+        return False
+    _, params = parse_header_parameters(media_type)
+    return params.get("keys") == "compact"
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Ответ в формате MessagePack. Выбирается заголовком
+    Accept: application/msgpack или параметром ?format=msgpack,
+    Accept: application/msgpack; keys=compact включает короткие ключи.
+    """
+
+    media_type = MEDIA_TYPE
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        if is_compact(accepted_media_type):
+            data = translate_keys(data, COMPACT_KEYS)
+
+        # Даты, Decimal и ленивые строки приводятся так же, как в JSON
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """Тело запроса в формате MessagePack, в том числе с короткими ключами."""
+
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            reason = str(exc) or exc.__class__.__name__
+            raise ParseError(f"MessagePack parse error - {reason}")
+
+        # Ключи заменяются отдельным обходом: при сборке словаря ещё не
+        # известно, является ли он словарём данных (DATA_MAPS)
+        if is_compact(media_type):
+            data = translate_keys(data, EXPANDED_KEYS)
+        return data
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views import View
+from drf_spectacular.drainage import GENERATOR_STATS
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+# Формат -> (рендерер, Content-Type)
+FORMATS = {
+    "yaml": (OpenApiYamlRenderer, "application/vnd.oai.openapi; charset=utf-8"),
+    "json": (OpenApiJsonRenderer, "application/vnd.oai.openapi+json"),
+}
+
+_artifacts = {}
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def schema_version():
+    """
+    Версия схемы: VERSION из SPECTACULAR_SETTINGS и хэш исходного кода
+    приложений, поэтому схема пересобирается при любом изменении кода.
+    """
+    digest = hashlib.sha256()
+    for directory in ("api", "server"):
+        for source in sorted((settings.BASE_DIR / directory).rglob("*.py")):
+            digest.update(source.read_bytes())
+    return f"{spectacular_settings.VERSION}-{digest.hexdigest()[:12]}"
+
+
+def artifact_path(fmt, directory=None):
+    directory = Path(directory or settings.SCHEMA_CACHE_DIR)
+    return directory / f"schema-{schema_version()}.{fmt}"
+
+
+class SchemaWarnings(Exception):
+    pass
+
+
+def build_schema_artifacts(directory=None, fail_on_warn=False):
+    """
+    Генерирует схему и сохраняет её во всех форматах, в том числе сжатой.
+    С fail_on_warn предупреждения drf-spectacular выбрасывают
+    SchemaWarnings, и файлы не записываются.
+    """
+    GENERATOR_STATS.reset()
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    if fail_on_warn and GENERATOR_STATS:
+        GENERATOR_STATS.emit_summary()
+        raise SchemaWarnings("Schema generation produced warnings or errors")
+
+    paths = []
+    for fmt, (renderer_class, _) in FORMATS.items():
+        content = renderer_class().render(schema, renderer_context={})
+        path = artifact_path(fmt, directory)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        for target, data in ((path, content), (Path(f"{path}.gz"), None)):
+            if data is None:
+                data = gzip.compress(content, mtime=0)
+            # Запись через временный файл, чтобы не отдать недописанную схему
+            tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+            paths.append(target)
+
+    return paths
+
+
+def get_schema_artifact(fmt):
+    """Возвращает (схема, сжатая схема), собирая её при первом обращении."""
+    if fmt not in _artifacts:
+        with _lock:
+            if fmt not in _artifacts:
+                path = artifact_path(fmt)
+                if not path.exists():
+                    build_schema_artifacts()
+                _artifacts[fmt] = (
+                    path.read_bytes(),
+                    Path(f"{path}.gz").read_bytes(),
+                )
+    return _artifacts[fmt]
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Слабое сравнение ETag со списком из If-None-Match: значения сравниваются
+    целиком без префикса W/, "*" совпадает с любым представлением.
+    """
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in (tag.removeprefix("W/") for tag in etags)
+
+
+class CachedSchemaView(View):
+    """
+    Отдаёт заранее собранную схему OpenAPI с ETag и gzip вместо генерации
+    на каждый запрос. Формат выбирается параметром format или заголовком
+    Accept, по умолчанию YAML, как у SpectacularAPIView.
+    """
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get("format")
+        if fmt not in FORMATS:
+            fmt = "json" if "json" in request.headers.get("Accept", "") else "yaml"
+
+        # Сжатая и несжатая схемы - разные представления, у них разные ETag
+        gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+        etag = f'"{schema_version()}-{fmt}{"-gzip" if gzipped else ""}"'
+        if etag_matches(etag, request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            content, compressed = get_schema_artifact(fmt)
+            response = HttpResponse(content, content_type=FORMATS[fmt][1])
+            if gzipped:
+                response.content = compressed
+                response["Content-Encoding"] = "gzip"
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=300"
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Q, Value, When
+from django.db.models.functions import Cast, Greatest, Least
+from django.utils import timezone
+
+from .archive import restore_players
+from .histogram import record_score_changes
+from .models import Player, PlayerMinigame, ScoreAggregatorState, ScoreEvent
+from .player_cache import invalidate_players
+from .wallet import WALLET_MAX
+
+# Количество строк, обновляемых одним UPDATE ... CASE
+UPDATE_CHUNK_SIZE = 500
+
+
+def _chunks(items, size=UPDATE_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def aggregate_score_events(batch_size=10000):
+    """
+    Сворачивает очередную пачку событий ScoreEvent в состояние игроков:
+    сумма очков добавляется к Player.own_coins (top_score растёт вместе с
+    ними), лучший результат попадает в PlayerMinigame.score. Учтённые события
+    удаляются в той же транзакции, поэтому каждое событие учитывается ровно
+    один раз. Позиция в журнале не запоминается: событие с меньшим id,
+    закоммиченное позже, останется в таблице и попадёт в следующую пачку.
+    Возвращает количество обработанных событий.
+    """
+    with transaction.atomic():
+        state, _ = ScoreAggregatorState.objects.select_for_update().get_or_create(
+            name="scores"
+        )
+        events = list(
+            ScoreEvent.objects.order_by("id").values_list(
+                "id", "player_id", "minigame_id", "score"
+            )[:batch_size]
+        )
+        if not events:
+            return 0
+
+        coins = defaultdict(int)
+        best = {}
+        for _, player_id, minigame_id, score in events:
+            coins[player_id] += score
+            if minigame_id is not None:
+                key = (player_id, minigame_id)
+                best[key] = max(best.get(key, score), score)
+
+        # Игроки, у которых изменится счёт мини-игры
+        scored = {player_id for player_id, _ in best}
+        # Игроки из архива возвращаются, чтобы их очки не потерялись
+        restore_players(coins.keys())
+        now = timezone.now()
+
+        for chunk in _chunks(coins.items()):
+            # Прежние значения нужны для переноса игроков в гистограмме счёта
+            current = Player.objects.select_for_update().filter(
+                id__in=[player_id for player_id, _ in chunk]
+            )
+            record_score_changes(
+                (
+                    top_score,
+                    max(top_score, min(own_coins + coins[player_id], WALLET_MAX)),
+                )
+                for player_id, own_coins, top_score in current.values_list(
+                    "id", "own_coins", "top_score"
+                )
+            )
+
+            # Сумма считается в bigint и ограничивается WALLET_MAX, как в
+            # apply_wallet_delta: переполнение int4 в PostgreSQL откатило бы
+            # пачку, и очередь остановилась бы на этих событиях навсегда
+            earned = Cast(
+                Case(
+                    *(
+                        When(id=player_id, then=Value(min(total, WALLET_MAX)))
+                        for player_id, total in chunk
+                    ),
+                    default=Value(0),
+                ),
+                BigIntegerField(),
+            )
+            balance = Least(F("own_coins") + earned, Value(WALLET_MAX))
+            Player.objects.filter(id__in=[player_id for player_id, _ in chunk]).update(
+                own_coins=balance,
+                top_score=Greatest("top_score", balance),
+                minigame_version=Case(
+                    When(id__in=scored, then=F("version") + 1),
+                    default=F("minigame_version"),
+                ),
+                last_active=now,
+                **Player.version_changes("wallet"),
+            )
+
+        for chunk in _chunks(best.items()):
+            pairs = [
+                Q(player_id=player_id, minigame_id=minigame_id)
+                for (player_id, minigame_id), _ in chunk
+            ]
+            PlayerMinigame.objects.filter(Q(*pairs, _connector=Q.OR)).update(
+                score=Greatest(
+                    "score",
+                    Case(
+                        *(
+                            When(pair, then=Value(score))
+                            for pair, (_, score) in zip(pairs, chunk)
+                        ),
+                        default=F("score"),
+                    ),
+                )
+            )
+
+        for chunk in _chunks(event_id for event_id, *_ in events):
+            ScoreEvent.objects.filter(id__in=chunk).delete()
+
+        # Для наблюдения: последнее учтённое событие
+        state.last_event_id = events[-1][0]
+        state.save(update_fields=["last_event_id", "updated_at"])
+        invalidate_players(coins.keys())
+
+    return len(events)
@@ -0,0 +1,92 @@
+import logging
+from functools import lru_cache
+
+from django.db import DatabaseError, connections
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+from .models import Player
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ("exact", "prefix", "fuzzy")
+# Короче трёх символов у строки нет ни одной полной триграммы
+FUZZY_MIN_LENGTH = 3
+TRIGRAM_INDEX = "api_player_name_trgm"
+
+
+class PlayerSearchPagination(CursorPagination):
+    """
+    Постраничный вывод по ключу: следующая страница начинается после
+    последнего имени предыдущей, без OFFSET и подсчёта общего числа.
+    """
+
+    ordering = "name"
+    page_size = 20
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+@lru_cache(maxsize=None)
+def trigram_enabled(using="default"):
+    """Доступен ли нечёткий поиск: PostgreSQL с расширением pg_trgm."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def search_players(query, mode="prefix", queryset=None):
+    """Игроки, имя которых совпадает с query, начинается с неё или похоже на неё."""
+    if queryset is None:
+        queryset = Player.objects.all()
+
+    if mode == "exact":
+        return queryset.filter(name=query)
+    if mode == "prefix":
+        return queryset.name_prefix(query)
+
+    if not trigram_enabled(queryset.db):
+        raise ValidationError("Нечёткий поиск доступен только на PostgreSQL с pg_trgm")
+    if len(query) < FUZZY_MIN_LENGTH:
+        raise ValidationError(
+            f"Для нечёткого поиска нужно не меньше {FUZZY_MIN_LENGTH} символов"
+        )
+    # Оператор % обслуживается GIN-индексом TRIGRAM_INDEX
+    return queryset.filter(name__trigram_similar=query)
+
+
+def create_trigram_index(using="default"):
+    """
+    Включает pg_trgm и строит GIN-индекс по Player.name без блокировки
+    таблицы. Индекс не описан в модели, т.к. расширение должно появиться
+    раньше миграции, которая его использует.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    table = connection.ops.quote_name(Player._meta.db_table)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс
+            cursor.execute(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = indexrelid "
+                "WHERE relname = %s AND NOT indisvalid",
+                [TRIGRAM_INDEX],
+            )
+            if cursor.fetchone() is not None:
+                cursor.execute(f"DROP INDEX CONCURRENTLY {TRIGRAM_INDEX}")
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {TRIGRAM_INDEX} "
+                f"ON {table} USING gin (name gin_trgm_ops)"
+            )
+    except DatabaseError:
+        logger.warning(
+            "Trigram index was not created, fuzzy search is disabled", exc_info=True
+        )
+    finally:
+        trigram_enabled.cache_clear()
@@ -1,6 +1,27 @@
-from rest_framework.serializers import ModelSerializer
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import (
+    BooleanField,
+    CharField,
+    ChoiceField,
+    DateTimeField,
+    FloatField,
+    IntegerField,
+    ListSerializer,
+    ModelSerializer,
+    Serializer,
+    SerializerMethodField,
+)
 
+from . import growth
+from .histogram import record_score_change
+from .minigame_leaderboard import LEADERBOARD_SIZE
 from .models import (
+    ArchivedPlayer,
     Equipment,
     Harvest,
     Minigame,
@@ -9,6 +30,9 @@ from .models import (
     PlayerHarvest,
     PlayerMinigame,
 )
+from .search import SEARCH_MODES
+from .sync import SECTION_FIELDS, SECTION_SOURCES, changed_sections, sections_since
+from .wallet import WALLET_MAX, WALLET_MIN
 
 
 class EquipmentSerializer(ModelSerializer):
@@ -20,7 +44,7 @@ class EquipmentSerializer(ModelSerializer):
 class HarvestSerializer(ModelSerializer):
     class Meta:
         model = Harvest
-        fields = ("id", "name", "description")
+        fields = ("id", "name", "description", "growth_rate")
 
 
 class MinigameSerializer(ModelSerializer):
@@ -36,10 +60,41 @@ class PlayerEquipmentSerializer(ModelSerializer):
 
 
 class PlayerHarvestSerializer(ModelSerializer):
+    """
+    Урожай игрока: harvest_amount - количество на момент ответа,
+    base_amount и last_tick - количество и время последней фиксации,
+    growth_rate - прирост в час, по которым клиент досчитывает урожай сам.
+    """
+
     class Meta:
         model = PlayerHarvest
         fields = ("harvest_name", "harvest_amount", "available", "gen_modified")
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        rate = self.growth_rate(instance)
+        now = self.context.setdefault("now", timezone.now())
+
+        data["harvest_amount"] = growth.amount_at(
+            instance.harvest_amount, rate, instance.last_tick, now
+        )
+        data["base_amount"] = instance.harvest_amount
+        data["growth_rate"] = rate
+        data["last_tick"] = DateTimeField().to_representation(instance.last_tick)
+        return data
+
+    def growth_rate(self, instance):
+        # Справочник загружается один раз на ответ, множители оборудования -
+        # один раз на игрока. Для списка игроков их заранее загружает
+        # PlayerListSerializer одним запросом
+        rates = self.context.get("harvest_rates")
+        if rates is None:
+            rates = self.context["harvest_rates"] = growth.catalog_rates()
+        multipliers = self.context.setdefault("harvest_multipliers", {})
+        if instance.player_id not in multipliers:
+            multipliers.update(growth.equipment_multipliers([instance.player_id]))
+        return growth.effective_rate(instance, rates, multipliers[instance.player_id])
+
 
 class PlayerMinigameSerializer(ModelSerializer):
     class Meta:
@@ -47,9 +102,24 @@ class PlayerMinigameSerializer(ModelSerializer):
         fields = ("minigame_name", "available", "complete", "score", "achievement")
 
 
+class PlayerListSerializer(ListSerializer):
+    def to_representation(self, data):
+        players = list(data.all() if isinstance(data, models.Manager) else data)
+        # Множители прироста урожая всех игроков списка - одним запросом,
+        # а не отдельным запросом на каждого игрока
+        multipliers = self.context.setdefault("harvest_multipliers", {})
+        multipliers.update(
+            growth.equipment_multipliers(
+                [player.pk for player in players if player.pk not in multipliers]
+            )
+        )
+        return super().to_representation(players)
+
+
 class PlayerSerializer(ModelSerializer):
     class Meta:
         model = Player
+        list_serializer_class = PlayerListSerializer
         fields = (
             "id",
             "name",
@@ -58,10 +128,12 @@ class PlayerSerializer(ModelSerializer):
             "own_coins",
             "user_review",
             "credit",
+            "version",
             "equipment",
             "harvest",
             "minigame",
         )
+        read_only_fields = ("version",)
 
     equipment = PlayerEquipmentSerializer(
         source="playerequipment_set", many=True, required=False
@@ -92,6 +164,9 @@ class PlayerSerializer(ModelSerializer):
                 "harvest_amount": harvest["harvest_amount"],
                 "available": harvest["available"],
                 "gen_modified": harvest["gen_modified"],
+                "base_amount": harvest["base_amount"],
+                "growth_rate": harvest["growth_rate"],
+                "last_tick": harvest["last_tick"],
             }
 
         data["harvest"] = harvest_data
@@ -109,7 +184,18 @@ class PlayerSerializer(ModelSerializer):
         data["minigame"] = minigame_data
         return data
 
+    def validate_name(self, value):
+        # Имена игроков в архиве остаются занятыми
+        if ArchivedPlayer.objects.filter(name=value).exists():
+            raise ValidationError("player with this name already exists.")
+        return value
+
     def update(self, instance, validated_data):
+        sections = changed_sections(validated_data)
+        # Оборудование меняет прирост урожая
+        if "equipment" in sections and "harvest" not in sections:
+            sections.append("harvest")
+
         # Обновляем поля Player
         instance.name = validated_data.get("name", instance.name)
         instance.gender = validated_data.get("gender", instance.gender)
@@ -118,11 +204,23 @@ class PlayerSerializer(ModelSerializer):
         instance.credit = validated_data.get("credit", instance.credit)
         instance.user_review = validated_data.get("user_review", instance.user_review)
 
-        # Проверяем, если own_coins больше текущего top_score, то обновляем top_score
-        if validated_data.get("own_coins", instance.own_coins) > instance.top_score:
-            instance.top_score = validated_data.get("own_coins", instance.own_coins)
+        with transaction.atomic():
+            # Прежний top_score читается под блокировкой строки: значение,
+            # загруженное get_object, могло устареть
+            old_top_score = (
+                Player.objects.select_for_update()
+                .values_list("top_score", flat=True)
+                .get(pk=instance.pk)
+            )
+            instance.top_score = old_top_score
+
+            # Проверяем, если own_coins больше текущего top_score,
+            # то обновляем top_score
+            if validated_data.get("own_coins", instance.own_coins) > instance.top_score:
+                instance.top_score = validated_data.get("own_coins", instance.own_coins)
 
-        instance.save()
+            instance.save()
+            record_score_change(old_top_score, instance.top_score)
 
         equipment_data = validated_data.pop("playerequipment_set", None)
         harvest_data = validated_data.pop("playerharvest_set", None)
@@ -130,6 +228,11 @@ class PlayerSerializer(ModelSerializer):
 
         instance = super().update(instance, validated_data)
 
+        # Выросший урожай фиксируется до изменения его прироста
+        now = timezone.now()
+        if equipment_data or harvest_data:
+            growth.materialize([instance.pk], now)
+
         if equipment_data:
             for equipment_item in equipment_data:
                 equipment, created = PlayerEquipment.objects.get_or_create(
@@ -143,8 +246,13 @@ class PlayerSerializer(ModelSerializer):
                 harvest, created = PlayerHarvest.objects.get_or_create(
                     player=instance, harvest_name=harvest_item["harvest_name"]
                 )
+                # Урожай растёт с момента, когда стал доступен или был задан
+                if harvest_item["available"] and not harvest.available:
+                    harvest.last_tick = now
                 harvest.available = harvest_item["available"]
-                harvest.harvest_amount = harvest_item["harvest_amount"]
+                if "harvest_amount" in harvest_item:
+                    harvest.harvest_amount = harvest_item["harvest_amount"]
+                    harvest.last_tick = now
                 harvest.gen_modified = harvest_item["gen_modified"]
                 harvest.harvest_name = harvest_item["harvest_name"]
                 harvest.save()
@@ -161,25 +269,87 @@ class PlayerSerializer(ModelSerializer):
                 minigame.achievement = minigame_item["achievement"]
                 minigame.save()
 
+            instance.refresh_achievements()
+
+        if sections:
+            Player.objects.filter(pk=instance.pk).bump_versions(*sections)
+            instance.refresh_from_db(fields=Player.VERSION_FIELDS)
+
         return instance
 
 
-class LeaderboardPlayerSerializer(ModelSerializer):
-    achievement = PlayerMinigameSerializer(
-        source="playerminigame_set", many=True, required=False, read_only=True
+class MinigameLeaderboardQuerySerializer(Serializer):
+    limit = IntegerField(
+        min_value=1, max_value=LEADERBOARD_SIZE, default=LEADERBOARD_SIZE
     )
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
 
-        achievement_data = {
-            minigame["minigame_name"]: {"achievement": minigame["achievement"]}
-            for minigame in data["achievement"]
-        }
+class MinigameLeaderboardSerializer(ModelSerializer):
+    name = CharField(source="player.name")
+
+    class Meta:
+        model = PlayerMinigame
+        fields = ("player_id", "name", "score")
+
+
+class PlayerSyncQuerySerializer(Serializer):
+    version = IntegerField(min_value=0, required=False)
+
+
+class PlayerSyncSerializer(Serializer):
+    """
+    Разделы документа игрока, изменённые после версии context["since"],
+    в том же виде, что и в PlayerSerializer.
+    """
+
+    item_serializers = {
+        "equipment": PlayerEquipmentSerializer,
+        "harvest": PlayerHarvestSerializer,
+        "minigame": PlayerMinigameSerializer,
+    }
+
+    def to_representation(self, instance):
+        data = {"id": instance.id, "version": instance.version}
+
+        for section in sections_since(instance, self.context["since"]):
+            if section in SECTION_FIELDS:
+                for field in SECTION_FIELDS[section]:
+                    data[field] = getattr(instance, field)
+                continue
+
+            serializer_class = self.item_serializers[section]
+            name_field = serializer_class.Meta.fields[0]
+            items = getattr(instance, SECTION_SOURCES[section]).all()
+            data[section] = {
+                item.pop(name_field): dict(item)
+                for item in serializer_class(
+                    items, many=True, context=self.context
+                ).data
+            }
 
-        data["achievement"] = achievement_data
         return data
 
+
+class LeaderboardPlayerSerializer(ModelSerializer):
+    achievement = SerializerMethodField()
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_achievement(self, instance):
+        # Справочник мини-игр загружается один раз на весь список
+        minigames = self.context.get("minigames")
+        if minigames is None:
+            minigames = list(Minigame.objects.order_by("id").values_list("id", "name"))
+            self.context["minigames"] = minigames
+
+        return {
+            name: {
+                "achievement": bool(
+                    instance.achievement_mask & Player.achievement_bit(minigame_id)
+                )
+            }
+            for minigame_id, name in minigames
+        }
+
     class Meta:
         model = Player
         fields = (
@@ -190,3 +360,62 @@ class LeaderboardPlayerSerializer(ModelSerializer):
             "achievement",
             "top_score",
         )
+
+
+class ScoreEventSerializer(Serializer):
+    player = IntegerField(min_value=1)
+    minigame = CharField(max_length=50, required=False, allow_null=True)
+    score = IntegerField(min_value=0, max_value=WALLET_MAX)
+    timestamp = DateTimeField()
+
+
+class WalletDeltaSerializer(Serializer):
+    own_money = IntegerField(min_value=WALLET_MIN, max_value=WALLET_MAX, required=False)
+    own_coins = IntegerField(min_value=WALLET_MIN, max_value=WALLET_MAX, required=False)
+    credit = IntegerField(min_value=WALLET_MIN, max_value=WALLET_MAX, required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise ValidationError("Нужно указать хотя бы одно поле кошелька")
+        return attrs
+
+
+class MinigameResultSerializer(Serializer):
+    minigame = CharField(max_length=50)
+    score = IntegerField(min_value=0)
+    complete = BooleanField(default=True)
+    achievement = BooleanField(default=False)
+    # По умолчанию начисляется столько очков, сколько набрано в игре
+    coins = IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault("coins", attrs["score"])
+        return attrs
+
+
+class PlayerSearchQuerySerializer(Serializer):
+    q = CharField(max_length=20, trim_whitespace=False)
+    mode = ChoiceField(choices=SEARCH_MODES, default="prefix")
+
+
+class PlayerSearchSerializer(ModelSerializer):
+    class Meta:
+        model = Player
+        fields = ("id", "name", "top_score")
+
+
+class PlayerStatisticsSerializer(Serializer):
+    activeUsersNum = IntegerField()
+    avgMark = FloatField()
+
+
+class SamplingProfileQuerySerializer(Serializer):
+    seconds = FloatField(min_value=0.1, default=5)
+    interval = FloatField(min_value=0.001, max_value=1, default=0.01)
+
+    def validate_seconds(self, value):
+        return min(value, settings.PROFILER_MAX_SECONDS)
+
+
+class QueryLogQuerySerializer(Serializer):
+    limit = IntegerField(min_value=1, max_value=1000, default=50)
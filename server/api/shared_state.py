@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .throttling import CacheBucketStore, MemoryBucketStore
+
+
+def process_local_state():
+    """
+    Состояние, которое должно быть общим для всех процессов, но хранится в
+    памяти каждого процесса: {назначение: настройка}. Кэш документов игроков
+    в LocMemCache отдаёт устаревшие версии из других воркеров, блокировки
+    Idempotency-Key не видны соседним процессам, а лимиты троттлинга и окна
+    прилипания к основной БД считаются отдельно в каждом воркере.
+    """
+    aliases = {
+        "кэш документов игроков": settings.PLAYER_CACHE_ALIAS,
+        "Idempotency-Key": settings.IDEMPOTENCY_CACHE_ALIAS,
+    }
+    if settings.REPLICA_DATABASES:
+        aliases["окна прилипания к основной БД"] = "default"
+    local = {
+        purpose: f"CACHES[{alias!r}]"
+        for purpose, alias in aliases.items()
+        if isinstance(caches[alias], LocMemCache)
+    }
+
+    store = import_string(settings.THROTTLE_BUCKET_STORE)
+    if issubclass(store, MemoryBucketStore) or (
+        issubclass(store, CacheBucketStore)
+        and isinstance(caches[settings.THROTTLE_CACHE_ALIAS], LocMemCache)
+    ):
+        local["корзины троттлинга"] = "THROTTLE_BUCKET_STORE"
+
+    return local
+
+
+def check_shared_state():
+    """
+    Отказывает в запуске нескольких воркеров (WEB_CONCURRENCY > 1), если
+    общее состояние хранится в памяти процесса: нужен общий кэш, например
+    Redis (django.core.cache.backends.redis.RedisCache) или Memcached.
+    """
+    if settings.WEB_CONCURRENCY <= 1:
+        return
+    local = process_local_state()
+    if local:
+        raise ImproperlyConfigured(
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} требует общего для "
+            "процессов кэша (Redis или Memcached), а в памяти процесса "
+            "хранятся: "
+            + ", ".join(f"{purpose} ({setting})" for purpose, setting in local.items())
+        )
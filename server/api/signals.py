@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 
+from .histogram import record_score_change
 from .models import (
     Equipment,
     Harvest,
@@ -10,6 +12,8 @@ from .models import (
     PlayerHarvest,
     PlayerMinigame,
 )
+from .querylog import install as install_query_log
+from .search import create_trigram_index
 
 
 @receiver(post_save, sender=Player)
@@ -41,11 +45,34 @@ def create_player_harvest(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Player)
 def create_player_minigame(sender, instance, created, **kwargs):
     if created:
-        minigame_list = Minigame.objects.all()
-        for minigame in minigame_list:
+        # Первая мини-игра справочника открыта с начала игры
+        minigame_list = Minigame.objects.order_by("id")
+        for index, minigame in enumerate(minigame_list):
             PlayerMinigame.objects.create(
                 player=instance,
                 minigame=minigame,
                 minigame_name=minigame.name,
-                available=False,
+                available=index == 0,
             )
+
+
+@receiver(post_save, sender=Player)
+def count_player_score(sender, instance, created, **kwargs):
+    if created:
+        record_score_change(None, instance.top_score)
+
+
+@receiver(post_delete, sender=Player)
+def uncount_player_score(sender, instance, **kwargs):
+    record_score_change(instance.top_score, None)
+
+
+@receiver(post_migrate)
+def create_player_name_index(sender, using, **kwargs):
+    if sender.name == "api":
+        create_trigram_index(using)
+
+
+@receiver(connection_created)
+def log_slow_queries(sender, connection, **kwargs):
+    install_query_log(connection)
@@ -0,0 +1,53 @@
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+
+class WriterLock:
+    """
+    Единственный писатель в базу SQLite: threading.Lock между потоками
+    процесса и flock на файле рядом с базой между процессами (воркерами
+    uvicorn). Повторный вход из того же потока не поддерживается.
+    """
+
+    def __init__(self, database_name):
+        self.path = Path(f"{database_name}.writer.lock")
+        self.lock = threading.Lock()
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            try:
+                if self.file is None:
+                    self.file = open(self.path, "a")
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            except BaseException:
+                self.lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+_writer_locks = {}
+_writer_locks_lock = threading.Lock()
+
+
+def writer_lock(alias="default"):
+    """Общая блокировка писателя для базы alias."""
+    name = str(settings.DATABASES[alias]["NAME"])
+    with _writer_locks_lock:
+        lock = _writer_locks.get(name)
+        if lock is None:
+            lock = _writer_locks[name] = WriterLock(name)
+        return lock
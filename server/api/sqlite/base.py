@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite с настройками SQLITE_PRAGMAS: журнал WAL (читатели не мешают
+    писателю), ожидание блокировки busy_timeout, synchronous=NORMAL, mmap и
+    кэш страниц. Транзакции начинаются с BEGIN IMMEDIATE: блокировка записи
+    берётся в начале и ждёт busy_timeout. С обычным BEGIN транзакция,
+    которая сначала читает, получает "database is locked" на первой записи,
+    если базу успел изменить кто-то другой.
+
+    При SQLITE_TUNING = False работает как django.db.backends.sqlite3.
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        if settings.SQLITE_TUNING:
+            for name, value in settings.SQLITE_PRAGMAS.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if settings.SQLITE_TUNING:
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,38 @@
+from .models import Player
+from .wallet import WALLET_FIELDS
+
+# Поля Player по разделам синхронизации
+SECTION_FIELDS = {
+    "profile": ("name", "gender", "user_review"),
+    "wallet": WALLET_FIELDS,
+}
+# Разделы со списком элементов -> ключ в validated_data PlayerSerializer
+SECTION_SOURCES = {
+    "equipment": "playerequipment_set",
+    "harvest": "playerharvest_set",
+    "minigame": "playerminigame_set",
+}
+
+
+def changed_sections(validated_data):
+    """Разделы, которые затрагивает обновление PlayerSerializer."""
+    sections = [
+        section
+        for section, fields in SECTION_FIELDS.items()
+        if any(field in validated_data for field in fields)
+    ]
+    sections += [
+        section
+        for section, source in SECTION_SOURCES.items()
+        if validated_data.get(source)
+    ]
+    return sections
+
+
+def sections_since(player, since):
+    """Разделы игрока, изменённые после версии since."""
+    return [
+        section
+        for section in Player.SYNC_SECTIONS
+        if getattr(player, f"{section}_version") > since
+    ]
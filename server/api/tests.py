@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import jobs
+from .minigame_leaderboard import (
+    minigame_histogram,
+    player_rank,
+    rebuild_minigame_histograms,
+)
+from .models import Job, Minigame, Player, PlayerMinigame, ScoreEvent
+from .querylog import read_only
+from .schema import schema_version
+from .scores import aggregate_score_events
+from .shared_state import check_shared_state
+from .wallet import WALLET_MAX
+
+
+class AggregateScoreEventsTests(TestCase):
+    def test_sum_above_column_range_is_clamped(self):
+        player = Player.objects.create(name="Doom Guy")
+        ScoreEvent.objects.bulk_create(
+            ScoreEvent(player_id=player.id, score=WALLET_MAX, created_at=timezone.now())
+            for _ in range(2)
+        )
+
+        self.assertEqual(aggregate_score_events(), 2)
+
+        player.refresh_from_db()
+        self.assertEqual(player.own_coins, WALLET_MAX)
+        self.assertEqual(player.top_score, WALLET_MAX)
+        self.assertFalse(ScoreEvent.objects.exists())
+
+
+class MinigameResultTests(TestCase):
+    def setUp(self):
+        for name in ("gameOne", "gameTwo"):
+            Minigame.objects.create(name=name, description=name)
+
+    def test_fresh_player_submits_first_minigame(self):
+        player = Player.objects.create(name="Doom Guy")
+
+        response = self.client.post(
+            f"/api/v1/player/{player.id}/minigame-result/",
+            {"minigame": "gameOne", "score": 150},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["own_coins"], 150)
+        self.assertTrue(response.json()["minigame"]["gameTwo"]["available"])
+
+    @override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"player_write": "1/min", "ip_write": "1/min"},
+        }
+    )
+    def test_replay_is_not_throttled(self):
+        player = Player.objects.create(name="Doom Guy")
+
+        def post(key):
+            return self.client.post(
+                f"/api/v1/player/{player.id}/minigame-result/",
+                {"minigame": "gameOne", "score": 150},
+                content_type="application/json",
+                HTTP_IDEMPOTENCY_KEY=key,
+            )
+
+        self.assertEqual(post("first").status_code, 200)
+        replay = post("first")
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(post("second").status_code, 429)
+
+
+class SharedStateTests(TestCase):
+    @override_settings(WEB_CONCURRENCY=2)
+    def test_process_local_cache_refused_for_several_workers(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared_state()
+
+    @override_settings(WEB_CONCURRENCY=1)
+    def test_process_local_cache_allowed_for_one_worker(self):
+        check_shared_state()
+
+
+class MinigameHistogramTests(TestCase):
+    def setUp(self):
+        self.minigame = Minigame.objects.create(name="gameOne", description="")
+        for score in (10, 20, 30):
+            player = Player.objects.create(name=f"Player {score}")
+            PlayerMinigame.objects.filter(player=player).update(score=score)
+
+    @override_settings(MINIGAME_EXACT_RANK_LIMIT=1)
+    def test_rank_uses_stored_histogram(self):
+        rebuild_minigame_histograms()
+        histogram = minigame_histogram(self.minigame.id)
+
+        with self.assertNumQueries(2):
+            place, _, total = player_rank(self.minigame.id, 15)
+        self.assertEqual((place, total), (3, 3))
+
+        # Запросы читают сохранённые корзины до следующего пересчёта
+        PlayerMinigame.objects.update(score=0)
+        self.assertEqual(minigame_histogram(self.minigame.id), histogram)
+
+
+class CachedSchemaViewTests(TestCase):
+    def test_gzip_etag_does_not_match_plain_schema(self):
+        gzip_etag = f'"{schema_version()}-json-gzip"'
+
+        response = self.client.get(
+            "/api/schema/?format=json", HTTP_IF_NONE_MATCH=gzip_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{schema_version()}-json"')
+
+        response = self.client.get(
+            "/api/schema/?format=json",
+            HTTP_IF_NONE_MATCH=f'"other", W/{gzip_etag}',
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_any_etag_matches(self):
+        response = self.client.get("/api/schema/", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, 304)
+
+
+class QueryLogTests(TestCase):
+    def test_side_effecting_selects_are_not_analyzed(self):
+        self.assertFalse(read_only("SELECT pg_notify(%s, %s)"))
+        self.assertFalse(read_only("SELECT nextval('api_job_id_seq')"))
+        self.assertFalse(read_only('SELECT "id" FROM "api_job" FOR UPDATE'))
+        self.assertTrue(
+            read_only(
+                'SELECT COUNT(*) FROM "api_player" WHERE ("id" IN (%s, %s) '
+                'AND NOT (EXISTS(SELECT 1 FROM "api_job")))'
+            )
+        )
+
+
+class JobLeaseTests(TestCase):
+    def test_worker_that_lost_its_lease_does_not_finish_the_job(self):
+        job = jobs.enqueue("aggregate_scores")
+        _, first_owner = jobs.claim_next()
+        # Аренда первого воркера истекла, задачу забрал второй
+        Job.objects.filter(id=job.id).update(locked_until=timezone.now())
+        _, second_owner = jobs.claim_next()
+
+        with self.assertLogs("api.jobs", "WARNING"):
+            self.assertEqual(jobs.run_job(job.id, first_owner), "lost")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ("running", second_owner))
+
+        self.assertEqual(jobs.run_job(job.id, second_owner), "done")
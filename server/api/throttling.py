@@ -0,0 +1,128 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class MemoryBucketStore:
+    """
+    Корзины в памяти процесса: минимальные накладные расходы, но лимит
+    действует отдельно в каждом воркере, поэтому при WEB_CONCURRENCY > 1 не
+    допускается.
+    """
+
+    # Размер, после которого из словаря удаляются давно заполненные корзины
+    max_buckets = 100000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            if len(self._buckets) > self.max_buckets:
+                self._evict(capacity, rate, now)
+
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, capacity, rate, now):
+        idle = capacity / rate
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if now - bucket[1] < idle
+        }
+
+
+class CacheBucketStore:
+    """
+    Корзины в кэше Django (THROTTLE_CACHE_ALIAS), общие для всех процессов.
+    Чтение и запись не атомарны, поэтому при гонке лимит может быть превышен
+    на несколько запросов.
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def consume(self, key, capacity, rate, now):
+        key = f"throttle:{key}"
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.cache.set(key, (tokens, now), int(capacity / rate) + 1)
+
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    return import_string(settings.THROTTLE_BUCKET_STORE)()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Троттлинг маркерной корзиной. Частота задаётся, как в DRF, в
+    DEFAULT_THROTTLE_RATES: "60/min" - корзина на 60 запросов, которая
+    полностью восполняется за минуту.
+    """
+
+    scope = None
+
+    def __init__(self):
+        num, period = api_settings.DEFAULT_THROTTLE_RATES[self.scope].split("/")
+        self.capacity = int(num)
+        self.rate = self.capacity / PERIODS[period[0]]
+        self._wait = None
+
+    def get_bucket_key(self, request, view):
+        raise NotImplementedError(".get_bucket_key() must be overridden")
+
+    def allow_request(self, request, view):
+        key = self.get_bucket_key(request, view)
+        if key is None:
+            return True
+
+        allowed, self._wait = get_bucket_store().consume(
+            f"{self.scope}:{key}", self.capacity, self.rate, time.monotonic()
+        )
+        metrics.increment(
+            f"throttle.{self.scope}.{'allowed' if allowed else 'rejected'}"
+        )
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class PlayerWriteThrottle(TokenBucketThrottle):
+    scope = "player_write"
+
+    def get_bucket_key(self, request, view):
+        return view.kwargs.get("pk")
+
+
+class IPWriteThrottle(TokenBucketThrottle):
+    scope = "ip_write"
+
+    def get_bucket_key(self, request, view):
+        return self.get_ident(request)
@@ -0,0 +1,98 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views import View
+from drf_spectacular.views import extend_schema
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .. import metrics, querylog
+from ..profiling import (
+    ProfilerBusy,
+    collapse,
+    get_report,
+    list_reports,
+    sample_stacks,
+)
+from ..serializers import QueryLogQuerySerializer, SamplingProfileQuerySerializer
+
+
+class SamplingProfileView(View):
+    """
+    Сэмплирующий профилировщик: в течение seconds секунд снимает стеки всех
+    потоков процесса, обработавшего запрос, и возвращает их в формате
+    collapsed stacks (flamegraph.pl, speedscope).
+
+    Асинхронное представление: под ASGI синхронные представления выполняются
+    в одном потоке, и сэмплирование в нём остановило бы остальные запросы.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if not await sync_to_async(IsAdminUser().has_permission)(request, self):
+            return JsonResponse(
+                {"detail": str(PermissionDenied.default_detail)},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        params = SamplingProfileQuerySerializer(data=request.GET)
+        if not params.is_valid():
+            return JsonResponse(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            stacks = await asyncio.to_thread(sample_stacks, **params.validated_data)
+        except ProfilerBusy:
+            return JsonResponse(
+                {"detail": "Профилировщик уже запущен"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        metrics.increment("profiler.samples", sum(stacks.values()))
+        return HttpResponse(collapse(stacks), content_type="text/plain; charset=utf-8")
+
+
+class RequestProfileListView(APIView):
+    """Последние отчёты по запросам с заголовком X-Profile: 1."""
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        return Response(list_reports(), status=status.HTTP_200_OK)
+
+
+class RequestProfileDetailView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request, profile_id):
+        profile = get_report(profile_id)
+        if profile is None:
+            raise Http404
+        return HttpResponse(profile.report(), content_type="text/plain; charset=utf-8")
+
+
+class QueryLogView(APIView):
+    """
+    Нормализованные запросы процесса по суммарному времени и последние
+    медленные запросы с вызвавшим их кодом и планом выполнения.
+    DELETE очищает журнал.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        params = QueryLogQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            querylog.report(**params.validated_data), status=status.HTTP_200_OK
+        )
+
+    @extend_schema(exclude=True)
+    def delete(self, request):
+        querylog.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
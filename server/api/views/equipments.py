@@ -5,11 +5,12 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from ..db_routers import ReplicaReadMixin
 from ..models import Equipment
 from ..serializers import EquipmentSerializer
 
 
-class EquipmentViewSet(ReadOnlyModelViewSet):
+class EquipmentViewSet(ReplicaReadMixin, ReadOnlyModelViewSet):
     queryset = Equipment.objects.all()
     serializer_class = EquipmentSerializer
 
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from ..events import get_broker, leaderboard_feed
+
+
+def format_event(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class EventStreamView(View):
+    """
+    Поток Server-Sent Events вместо периодического опроса API.
+
+    GET /api/v1/events/?player=<id>&leaderboard=1
+
+    - player: события "player" с id и версией игрока после каждого его
+      изменения, сами изменения догружаются через /player/{id}/sync/;
+    - leaderboard: событие "leaderboard" со всей таблицей лидеров
+      (reset=true) при подключении, затем только разница.
+
+    Работает только под ASGI (server.asgi).
+    """
+
+    async def get(self, request, *args, **kwargs):
+        channels = []
+
+        player = request.GET.get("player")
+        if player is not None:
+            if not player.isdigit():
+                return JsonResponse(
+                    {"detail": "Player ID должен быть целым числом"}, status=400
+                )
+            channels.append(f"player:{int(player)}")
+
+        leaderboard = request.GET.get("leaderboard") in ("1", "true")
+        if leaderboard:
+            channels.append("leaderboard")
+
+        if not channels:
+            return JsonResponse(
+                {"detail": "Нужно указать player и/или leaderboard"}, status=400
+            )
+
+        async def stream():
+            broker = get_broker()
+            subscription = broker.subscribe(channels)
+            try:
+                yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+                if leaderboard:
+                    snapshot = await leaderboard_feed.snapshot()
+                    yield format_event("leaderboard", snapshot)
+
+                while True:
+                    try:
+                        item = await subscription.get(settings.EVENTS_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        # Комментарий не даёт прокси закрыть соединение
+                        yield ": ping\n\n"
+                        continue
+
+                    if item is None:
+                        break
+                    channel, data = item
+                    yield format_event(channel.split(":", 1)[0], data)
+            finally:
+                broker.unsubscribe(subscription)
+
+        response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # nginx не должен буферизовать поток
+        response["X-Accel-Buffering"] = "no"
+        return response
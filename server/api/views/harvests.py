@@ -5,11 +5,12 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from ..db_routers import ReplicaReadMixin
 from ..models import Harvest
 from ..serializers import HarvestSerializer
 
 
-class HarvestViewSet(ReadOnlyModelViewSet):
+class HarvestViewSet(ReplicaReadMixin, ReadOnlyModelViewSet):
     queryset = Harvest.objects.all()
     serializer_class = HarvestSerializer
 
@@ -1,4 +1,3 @@
-from django.db.models import Avg
 from drf_spectacular.openapi import OpenApiResponse
 from drf_spectacular.utils import OpenApiExample
 from drf_spectacular.views import extend_schema
@@ -9,16 +8,20 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from .. import archive
+from ..db_routers import ReplicaReadMixin
+from ..histogram import approximate_rank
 from ..models import Player
 from ..serializers import (
     LeaderboardPlayerSerializer,
-    PlayerMinigameSerializer,
     PlayerSerializer,
+    PlayerStatisticsSerializer,
 )
 
 
-class LiderboardView(ReadOnlyModelViewSet):
+class LiderboardView(ReplicaReadMixin, ReadOnlyModelViewSet):
     serializer_class = LeaderboardPlayerSerializer
+    player_lookup_kwarg = "pk"
 
     common_minigame_status_codes = {
         status.HTTP_400_BAD_REQUEST: OpenApiResponse(
@@ -87,11 +90,12 @@ class LiderboardView(ReadOnlyModelViewSet):
     def list(self, request):
         queryset = self.get_queryset()
 
-        total_players = Player.objects.count()
-        players_with_reviews = Player.objects.exclude(user_review=None).count()
-        average_review = Player.objects.exclude(user_review=None).aggregate(
-            Avg("user_review")
-        )["user_review__avg"]
+        # Вместе с игроками из архива
+        (
+            total_players,
+            players_with_reviews,
+            average_review,
+        ) = archive.player_statistics()
 
         if average_review is None:
             average_review = 0.0
@@ -189,20 +193,11 @@ class LiderboardView(ReadOnlyModelViewSet):
 
         player_rank = list(players).index(player) + 1
 
-        serializer_game = PlayerMinigameSerializer(
-            player.playerminigame_set.all(), many=True
-        )
-        minigame_data = serializer_game.data
-
-        achievement_count = sum(
-            1 for game in minigame_data if game.get("achievement", False)
-        )
-
         response_data = {
             "player_id": player.id,
             "player_name": player.name,
             "place": player_rank,
-            "achievement_count": achievement_count,
+            "achievement_count": player.achievement_count,
             "own_coins": player.own_coins,
             "top_score": player.top_score,
             "user_review": player.user_review,
@@ -212,8 +207,68 @@ class LiderboardView(ReadOnlyModelViewSet):
 
         return Response(response_data)
 
+    @extend_schema(
+        summary="Приблизительное место игрока и процентиль",
+        tags=["Liderboard"],
+        description="""
+            Приблизительное место игрока в рейтинге по top_score и доля игроков,
+            которые его опережают ("вы в 12% лучших"). Считается по гистограмме
+            счёта без просмотра таблицы игроков.
+
+            rank_error - максимальное отклонение place от точного места
+            (количество других игроков в той же корзине гистограммы).
 
-class PlayerStatistics(APIView):
+            Параметр запроса:
+                id - идентификатор игрока
+                GET /api/v1/liderboard/{id}/percentile/
+            """,
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=None,
+                description="Ответ получен",
+                examples=[
+                    OpenApiExample(
+                        name="Процентиль",
+                        value={
+                            "player_id": 6,
+                            "top_score": 520,
+                            "place": 1204,
+                            "rank_error": 35,
+                            "top_percent": 12.0,
+                            "total_players": 10033,
+                        },
+                    )
+                ],
+            ),
+            **common_minigame_status_codes,
+        },
+    )
+    @action(detail=True, methods=["get"], url_path="percentile")
+    def get_player_percentile(self, request, pk=None):
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise ValidationError("Player ID должен быть целым числом")
+
+        top_score = Player.objects.filter(id=pk).values_list("top_score", flat=True)
+        if not top_score:
+            return Response({"error": "Player not found"}, status=404)
+
+        place, rank_error, total_players = approximate_rank(top_score[0])
+
+        return Response(
+            {
+                "player_id": pk,
+                "top_score": top_score[0],
+                "place": place,
+                "rank_error": rank_error,
+                "top_percent": round(place / total_players * 100, 1),
+                "total_players": total_players,
+            }
+        )
+
+
+class PlayerStatistics(ReplicaReadMixin, APIView):
     @extend_schema(
         summary="Получить данные по игрокам и оценке",
         tags=["Statistics"],
@@ -221,18 +276,16 @@ class PlayerStatistics(APIView):
             "activeUsersNum": общее количество зарегистрированных игроков,
             "avgMark": средняя оценка игры
             """,
+        responses=PlayerStatisticsSerializer,
     )
     def get(self, request) -> Response:
-        # Общее количество игроков
-        total_players = Player.objects.count()
-
-        # Количество игроков у которых user_review не равно None
-        players_with_reviews = Player.objects.exclude(user_review=None).count()
-
-        # Средняя оценка игроков с user_review не равным None
-        average_review = Player.objects.exclude(user_review=None).aggregate(
-            Avg("user_review")
-        )["user_review__avg"]
+        # Общее количество игроков, количество оценок и средняя оценка,
+        # включая игроков из архива
+        (
+            total_players,
+            players_with_reviews,
+            average_review,
+        ) = archive.player_statistics()
 
         if players_with_reviews < 10:
             average_review = 5
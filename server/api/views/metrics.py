@@ -0,0 +1,15 @@
+from drf_spectacular.views import extend_schema
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .. import metrics
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request) -> Response:
+        return Response(metrics.snapshot(), status=status.HTTP_200_OK)
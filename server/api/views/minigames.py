@@ -1,15 +1,23 @@
+from django.http import Http404
 from drf_spectacular.openapi import OpenApiResponse
-from drf_spectacular.utils import OpenApiExample
+from drf_spectacular.utils import OpenApiExample, OpenApiParameter
 from drf_spectacular.views import extend_schema
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from ..models import Minigame
-from ..serializers import MinigameSerializer
+from ..db_routers import ReplicaReadMixin
+from ..minigame_leaderboard import player_rank, top_scores
+from ..models import Minigame, PlayerMinigame
+from ..serializers import (
+    MinigameLeaderboardQuerySerializer,
+    MinigameLeaderboardSerializer,
+    MinigameSerializer,
+)
 
 
-class MinigameViewSet(ReadOnlyModelViewSet):
+class MinigameViewSet(ReplicaReadMixin, ReadOnlyModelViewSet):
     queryset = Minigame.objects.all()
     serializer_class = MinigameSerializer
 
@@ -86,3 +94,120 @@ class MinigameViewSet(ReadOnlyModelViewSet):
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    def get_minigame(self):
+        """Мини-игра по имени или идентификатору из адреса."""
+        lookup = self.kwargs["pk"]
+        queryset = self.get_queryset()
+        minigame = queryset.filter(name=lookup).first()
+        if minigame is None and lookup.isdigit():
+            minigame = queryset.filter(pk=int(lookup)).first()
+        if minigame is None:
+            raise Http404
+        return minigame
+
+    @extend_schema(
+        summary="Лучшие игроки мини-игры",
+        tags=["Minigame"],
+        operation_id="minigame_liderboard_list",
+        description="""
+        Список лучших игроков мини-игры по PlayerMinigame.score в порядке
+        убывания, до 100 игроков.
+
+        Параметр запроса:
+            name - имя (или идентификатор) мини-игры
+            GET /api/v1/minigame/{name}/liderboard/
+        """,
+        parameters=[
+            OpenApiParameter("limit", int, description="Количество игроков, до 100"),
+        ],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=MinigameLeaderboardSerializer(many=True),
+                description="Ответ получен",
+                examples=[
+                    OpenApiExample(
+                        name="Лидеры мини-игры",
+                        value={
+                            "minigame": "gameOne",
+                            "liderboard": [
+                                {"player_id": 6, "name": "Doom Guy", "score": 800}
+                            ],
+                        },
+                    )
+                ],
+            ),
+            **common_minigame_status_codes,
+        },
+    )
+    @action(detail=True, methods=["get"], url_path="liderboard")
+    def get_leaderboard(self, request, pk=None):
+        params = MinigameLeaderboardQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        minigame = self.get_minigame()
+        queryset = top_scores(minigame.id, params.validated_data["limit"])
+        serializer = MinigameLeaderboardSerializer(queryset, many=True)
+        return Response({"minigame": minigame.name, "liderboard": serializer.data})
+
+    @extend_schema(
+        summary="Место игрока в таблице лидеров мини-игры",
+        tags=["Minigame"],
+        operation_id="minigame_liderboard_player_rank",
+        description="""
+        Место игрока по результату в мини-игре. Первые 10000 мест считаются
+        точно, дальше место оценивается по гистограмме результатов:
+        rank_error - максимальное отклонение place от точного места.
+
+        Параметры запроса:
+            name - имя (или идентификатор) мини-игры
+            player_id - идентификатор игрока
+            GET /api/v1/minigame/{name}/liderboard/{player_id}/
+        """,
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=None,
+                description="Ответ получен",
+                examples=[
+                    OpenApiExample(
+                        name="Место игрока",
+                        value={
+                            "minigame": "gameOne",
+                            "player_id": 6,
+                            "score": 120,
+                            "place": 1204,
+                            "rank_error": 0,
+                            "top_percent": 12.0,
+                            "total_players": 10033,
+                        },
+                    )
+                ],
+            ),
+            **common_minigame_status_codes,
+        },
+    )
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"liderboard/(?P<player_id>[0-9]+)",
+    )
+    def get_player_rank(self, request, pk=None, player_id=None):
+        minigame = self.get_minigame()
+        score = PlayerMinigame.objects.filter(
+            minigame=minigame, player_id=int(player_id)
+        ).values_list("score", flat=True)
+        if not score:
+            return Response({"error": "Player not found"}, status=404)
+
+        place, rank_error, total_players = player_rank(minigame.id, score[0])
+        return Response(
+            {
+                "minigame": minigame.name,
+                "player_id": int(player_id),
+                "score": score[0],
+                "place": place,
+                "rank_error": rank_error,
+                "top_percent": round(place / total_players * 100, 1),
+                "total_players": total_players,
+            }
+        )
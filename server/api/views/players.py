@@ -1,14 +1,32 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from drf_spectacular.openapi import OpenApiResponse
-from drf_spectacular.utils import OpenApiExample
+from drf_spectacular.utils import OpenApiExample, OpenApiParameter
 from drf_spectacular.views import extend_schema
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from ..models import Player
-from ..serializers import PlayerSerializer
+from .. import archive, growth, player_cache
+from ..db_routers import ReplicaReadMixin, mark_player_written
+from ..idempotency import IdempotentWriteMixin
+from ..minigame_results import opening_minigame_id, resolve_minigame, submit_result
+from ..models import Minigame, Player
+from ..search import PlayerSearchPagination, search_players
+from ..serializers import (
+    MinigameResultSerializer,
+    PlayerSearchQuerySerializer,
+    PlayerSearchSerializer,
+    PlayerSerializer,
+    PlayerSyncQuerySerializer,
+    PlayerSyncSerializer,
+    WalletDeltaSerializer,
+)
+from ..throttling import IPWriteThrottle, PlayerWriteThrottle
+from ..wallet import WALLET_FIELDS, apply_wallet_delta
 
 common_value = {
     "id": 1,
@@ -24,12 +42,29 @@ common_value = {
         "robot": {"available": False},
     },
     "harvest": {
-        "tomatoes": {"harvest_amount": 0, "available": True, "gen_modified": False},
-        "peppers": {"harvest_amount": 0, "available": False, "gen_modified": False},
+        "tomatoes": {
+            "harvest_amount": 45,
+            "available": True,
+            "gen_modified": False,
+            "base_amount": 30,
+            "growth_rate": 30.0,
+            "last_tick": "2023-11-01T12:00:00Z",
+        },
+        "peppers": {
+            "harvest_amount": 0,
+            "available": False,
+            "gen_modified": False,
+            "base_amount": 0,
+            "growth_rate": 0.0,
+            "last_tick": "2023-11-01T12:00:00Z",
+        },
         "strawberries": {
             "harvest_amount": 0,
             "available": False,
             "gen_modified": False,
+            "base_amount": 0,
+            "growth_rate": 0.0,
+            "last_tick": "2023-11-01T12:00:00Z",
         },
     },
     "minigame": {
@@ -70,13 +105,37 @@ common_player_status_codes = {
 }
 
 
-class PlayerViewSet(ModelViewSet):
+class PlayerViewSet(IdempotentWriteMixin, ReplicaReadMixin, ModelViewSet):
     queryset = Player.objects.all()
     serializer_class = PlayerSerializer
+    # С реплик читается документ игрока и его изменения (только вне окна
+    # прилипания после записи) и поиск по имени
+    replica_actions = ("retrieve", "search", "sync")
+    write_actions = ("reset_to_default",)
+    player_lookup_kwarg = "pk"
+
+    def get_throttles(self):
+        if self.is_write(self.request):
+            return [PlayerWriteThrottle(), IPWriteThrottle()]
+        return []
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if str(self.kwargs.get("pk", "")).isdigit():
+            archive.touch_player(int(self.kwargs["pk"]))
 
     def get_object(self):
         queryset = self.filter_queryset(self.get_queryset())
-        obj = get_object_or_404(queryset, pk=self.kwargs["pk"])
+        try:
+            obj = get_object_or_404(queryset, pk=self.kwargs["pk"])
+        except Http404:
+            # Неактивный игрок мог быть перенесён в архив
+            if not archive.restore_players([self.player_id()]):
+                raise
+            mark_player_written(self.player_id())
+            obj = get_object_or_404(
+                queryset.using(DEFAULT_DB_ALIAS), pk=self.player_id()
+            )
         self.check_object_permissions(self.request, obj)
         return obj
 
@@ -91,7 +150,10 @@ class PlayerViewSet(ModelViewSet):
         responses=common_player_status_codes,
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        # Связанные записи всех игроков страницы - тремя запросами
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(
+            "playerequipment_set", "playerharvest_set", "playerminigame_set"
+        )
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -167,9 +229,12 @@ class PlayerViewSet(ModelViewSet):
         ],
     )
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        def build():
+            return self.get_serializer(self.get_object()).data
+
+        document = player_cache.get_player_document(self.player_id(), build)
+        # Урожай в документе из кэша досчитывается на момент ответа
+        return Response(growth.grow_document(document))
 
     @extend_schema(
         summary='Удаление объекта класса "Игрок"',
@@ -187,7 +252,9 @@ class PlayerViewSet(ModelViewSet):
     )
     def destroy(self, request, *args, **kwargs):
         instance = instance = self.get_object()
+        player_id = instance.pk
         self.perform_destroy(instance)
+        player_cache.invalidate_players([player_id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @extend_schema(
@@ -216,9 +283,23 @@ class PlayerViewSet(ModelViewSet):
     )
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
-        instance = self.get_object()
         data = request.data
 
+        # Поля кошелька вида {"inc": 50} применяются атомарным UPDATE
+        deltas = {
+            field: data.pop(field)["inc"]
+            for field in WALLET_FIELDS
+            if isinstance(data.get(field), dict) and "inc" in data[field]
+        }
+        if deltas:
+            deltas = self.validate_deltas(deltas)
+            if partial and not data:
+                # Только изменения кошелька: игрок не читается и не
+                # сохраняется, в ответе новые значения, как у increment
+                changed = self.apply_deltas(deltas)
+                player_cache.refresh_player(changed["id"])
+                return Response(changed)
+
         # Преобразование equipment из словаря в список только если есть данные
         equipment_data = data.get("equipment")
         if equipment_data is not None:
@@ -238,9 +319,14 @@ class PlayerViewSet(ModelViewSet):
             harvest_data = [
                 {
                     "harvest_name": harvest_name,
-                    "harvest_amount": harvest_info.get("harvest_amount", 0),
                     "available": harvest_info["available"],
                     "gen_modified": harvest_info.get("gen_modified", False),
+                    # Без harvest_amount урожай продолжает расти на сервере
+                    **(
+                        {"harvest_amount": harvest_info["harvest_amount"]}
+                        if "harvest_amount" in harvest_info
+                        else {}
+                    ),
                 }
                 for harvest_name, harvest_info in harvest_data.items()
                 if "available" in harvest_info
@@ -263,9 +349,21 @@ class PlayerViewSet(ModelViewSet):
             ]
             data["minigame"] = minigame_data
 
-        serializer = self.get_serializer(instance, data=data, partial=partial)
-        serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+        # Изменения кошелька применяются после проверки остальных полей и
+        # в одной транзакции с ними
+        with transaction.atomic():
+            instance = self.get_object()
+            serializer = self.get_serializer(instance, data=data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            if deltas:
+                self.apply_deltas(deltas)
+                # save записывает только изменённые поля, поэтому кошелёк
+                # после UPDATE им не перезаписывается
+                instance.refresh_from_db(
+                    fields=[*WALLET_FIELDS, "top_score", *Player.VERSION_FIELDS]
+                )
+            self.perform_update(serializer)
+        player_cache.refresh_player(instance.pk)
         return Response(serializer.data)
 
     @extend_schema(
@@ -312,6 +410,242 @@ class PlayerViewSet(ModelViewSet):
         kwargs["partial"] = True
         return self.update(request, *args, **kwargs)
 
+    def player_id(self):
+        try:
+            return int(self.kwargs["pk"])
+        except ValueError:
+            raise ValidationError("Player ID должен быть целым числом")
+
+    def validate_deltas(self, deltas):
+        serializer = WalletDeltaSerializer(data=deltas)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def apply_deltas(self, deltas):
+        changed = apply_wallet_delta(self.player_id(), deltas)
+        if changed is None and archive.restore_players([self.player_id()]):
+            changed = apply_wallet_delta(self.player_id(), deltas)
+        if changed is None:
+            raise Http404
+        return changed
+
+    @extend_schema(
+        summary="Атомарное изменение кошелька игрока",
+        tags=["Player"],
+        description="""
+    Прибавление значений к полям кошелька игрока без предварительного чтения.
+    Значения могут быть отрицательными. Изменение выполняется одним запросом
+    к базе данных, поэтому одновременные изменения из разных сессий не
+    теряются. При увеличении own_coins обновляется и top_score.
+
+    Тот же результат даёт PATCH /api/v1/player/{id} с полями вида
+    {"own_coins": {"inc": 50}}.
+
+    В ответе будут получены только изменённые поля.
+    """,
+        request=WalletDeltaSerializer,
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=None,
+                description="Ответ получен",
+                examples=[
+                    OpenApiExample(
+                        name="Новые значения",
+                        value={
+                            "id": 1,
+                            "own_money": 1000,
+                            "own_coins": 150,
+                            "credit": 0,
+                            "top_score": 150,
+                        },
+                    )
+                ],
+            ),
+            **common_player_status_codes,
+        },
+        examples=[
+            OpenApiExample(
+                name="Начисление очков",
+                value={"own_coins": 50, "own_money": -100},
+            )
+        ],
+    )
+    @action(detail=True, methods=["post"], url_path="increment")
+    def increment(self, request, pk=None):
+        changed = self.apply_deltas(self.validate_deltas(request.data))
+        player_cache.refresh_player(changed["id"])
+        return Response(changed, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Результат мини-игры",
+        tags=["Player"],
+        description="""
+    Записывает результат мини-игры одним запросом вместо PATCH всего
+    документа игрока:
+
+    - `minigame`: имя или идентификатор мини-игры.
+    - `score`: набранный счёт, в PlayerMinigame.score остаётся лучший.
+    - `complete`: игра пройдена (по умолчанию true), тогда открывается
+      следующая мини-игра.
+    - `achievement`: получено достижение мини-игры (по умолчанию false).
+    - `coins`: сколько очков начислить в own_coins (по умолчанию равно
+      `score`), top_score растёт вместе с ними.
+
+    Прохождение и достижение не снимаются. Первая мини-игра открыта с начала
+    игры, результат мини-игры, ещё не открытой игроку (available = false),
+    отклоняется с кодом 409. В ответе будут получены только изменённые поля.
+    """,
+        request=MinigameResultSerializer,
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=None,
+                description="Ответ получен",
+                examples=[
+                    OpenApiExample(
+                        name="Игра пройдена",
+                        value={
+                            "id": 1,
+                            "version": 12,
+                            "own_coins": 150,
+                            "top_score": 150,
+                            "achievement_count": 1,
+                            "minigame": {
+                                "gameOne": {
+                                    "available": True,
+                                    "complete": True,
+                                    "score": 150,
+                                    "achievement": True,
+                                },
+                                "gameTwo": {
+                                    "available": True,
+                                    "complete": False,
+                                    "score": 0,
+                                    "achievement": False,
+                                },
+                            },
+                        },
+                    )
+                ],
+            ),
+            **common_player_status_codes,
+            status.HTTP_409_CONFLICT: OpenApiResponse(
+                response=None, description="Мини-игра ещё не открыта для игрока"
+            ),
+        },
+        examples=[
+            OpenApiExample(
+                name="Результат мини-игры",
+                value={"minigame": "gameOne", "score": 150, "achievement": True},
+            )
+        ],
+    )
+    @action(detail=True, methods=["post"], url_path="minigame-result")
+    def minigame_result(self, request, pk=None):
+        serializer = MinigameResultSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = dict(serializer.validated_data)
+
+        try:
+            minigame, following = resolve_minigame(result.pop("minigame"))
+        except Minigame.DoesNotExist:
+            raise ValidationError({"minigame": "Мини-игра не найдена"})
+
+        changed = submit_result(self.player_id(), minigame, following, **result)
+        if changed is None and archive.restore_players([self.player_id()]):
+            changed = submit_result(self.player_id(), minigame, following, **result)
+        if changed is None:
+            raise Http404
+        player_cache.refresh_player(changed["id"])
+        return Response(changed, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Изменения игрока после версии клиента",
+        tags=["Player"],
+        description="""
+    Возвращает только разделы игрока, изменённые после версии `version`
+    (profile, wallet, equipment, harvest, minigame), в том же виде, что и
+    полный документ, и текущую версию игрока. Если изменений нет, ответ
+    304 без тела. Без параметра `version` возвращается весь документ.
+    """,
+        parameters=[
+            OpenApiParameter(
+                "version", int, description="Последняя известная клиенту версия"
+            ),
+        ],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(
+                response=None,
+                description="Изменённые разделы",
+                examples=[
+                    OpenApiExample(
+                        name="Изменился кошелёк",
+                        value={
+                            "id": 1,
+                            "version": 18,
+                            "own_money": 1000,
+                            "own_coins": 150,
+                            "credit": 0,
+                        },
+                    )
+                ],
+            ),
+            status.HTTP_304_NOT_MODIFIED: OpenApiResponse(
+                response=None, description="Изменений нет"
+            ),
+            **common_player_status_codes,
+        },
+    )
+    @action(detail=True, methods=["get"], url_path="sync")
+    def sync(self, request, pk=None):
+        params = PlayerSyncQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        # Без версии клиента отдаются все разделы
+        since = params.validated_data.get("version", -1)
+
+        player = self.get_object()
+        if player.version <= since:
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+
+        serializer = PlayerSyncSerializer(player, context={"since": since})
+        return Response(serializer.data)
+
+    @extend_schema(
+        summary="Поиск игроков по имени",
+        tags=["Player"],
+        description="""
+    Поиск игроков по имени: точное совпадение (`exact`), начало имени
+    (`prefix`, по умолчанию) или нечёткий поиск по триграммам (`fuzzy`,
+    только PostgreSQL). Результаты упорядочены по имени, следующая страница
+    запрашивается по ссылке `next`.
+    """,
+        parameters=[
+            OpenApiParameter("q", str, required=True, description="Строка поиска"),
+            OpenApiParameter(
+                "mode", str, enum=["exact", "prefix", "fuzzy"], description="Режим"
+            ),
+            OpenApiParameter("limit", int, description="Размер страницы, до 100"),
+            OpenApiParameter("cursor", str, description="Курсор страницы"),
+        ],
+        responses={status.HTTP_200_OK: PlayerSearchSerializer(many=True)},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="search",
+        pagination_class=PlayerSearchPagination,
+    )
+    def search(self, request):
+        params = PlayerSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        queryset = search_players(
+            params.validated_data["q"], params.validated_data["mode"]
+        ).only("id", "name", "top_score")
+
+        page = self.paginate_queryset(queryset)
+        serializer = PlayerSearchSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @extend_schema(
         summary="Сброс данных об игроке на значения по умолчанию",
         tags=["Player"],
@@ -331,15 +665,19 @@ class PlayerViewSet(ModelViewSet):
             equipment.available = False
             equipment.save()
 
-        # Обновление полей смежной модели PlayerHarvest
+        # Обновление полей смежной модели PlayerHarvest, выросший урожай
+        # фиксируется до остановки роста
+        growth.materialize([player.pk])
         for harvest in player.playerharvest_set.all():
             harvest.available = False
             harvest.gen_modified = False
             harvest.save()
 
-        # Обновление полей смежной модели PlayerMinigame
+        # Обновление полей смежной модели PlayerMinigame, открытой остаётся
+        # только первая мини-игра справочника
+        opening_id = opening_minigame_id()
         for minigame in player.playerminigame_set.all():
-            minigame.available = False
+            minigame.available = minigame.minigame_id == opening_id
             minigame.complete = False
             minigame.achievement = False
             minigame.score = 0
@@ -348,7 +686,12 @@ class PlayerViewSet(ModelViewSet):
         player.own_money = Player._meta.get_field("own_money").get_default()
         player.own_coins = Player._meta.get_field("own_coins").get_default()
         player.credit = Player._meta.get_field("credit").get_default()
+        player.achievement_mask = 0
+        player.achievement_count = 0
         player.save()
+        Player.objects.filter(pk=player.pk).bump_versions(*Player.SYNC_SECTIONS)
+        player.refresh_from_db(fields=Player.VERSION_FIELDS)
+        player_cache.refresh_player(player.pk)
 
         serializer = PlayerSerializer(player)
         return Response(serializer.data, status=status.HTTP_200_OK)
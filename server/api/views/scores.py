@@ -0,0 +1,90 @@
+from django.conf import settings
+from drf_spectacular.openapi import OpenApiResponse
+from drf_spectacular.utils import OpenApiExample
+from drf_spectacular.views import extend_schema
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..models import Minigame, ScoreEvent
+from ..serializers import ScoreEventSerializer
+from ..throttling import IPWriteThrottle
+
+
+class ScoreEventIngestView(APIView):
+    throttle_classes = [IPWriteThrottle]
+
+    @extend_schema(
+        summary="Приём пачки событий счёта",
+        tags=["Player"],
+        description="""
+            Приём результатов игровых сессий пачкой событий.
+            События только записываются в журнал, а в состояние игроков,
+            мини-игр и таблицу лидеров их переносит фоновый агрегатор
+            (manage.py aggregatescores).
+
+            Поля события:
+            - `player`: идентификатор игрока
+            - `minigame`: имя мини-игры (необязательно)
+            - `score`: заработанные очки
+            - `timestamp`: время события на клиенте
+
+            В ответе будет получено количество принятых событий.
+            """,
+        request=ScoreEventSerializer(many=True),
+        responses={
+            status.HTTP_202_ACCEPTED: OpenApiResponse(
+                response=None,
+                description="События приняты",
+                examples=[OpenApiExample(name="Принято", value={"accepted": 2})],
+            ),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(
+                response=None, description="Неправильный запрос"
+            ),
+        },
+        examples=[
+            OpenApiExample(
+                name="События",
+                value=[
+                    {
+                        "player": 1,
+                        "minigame": "gameOne",
+                        "score": 120,
+                        "timestamp": "2023-10-25T12:00:00Z",
+                    },
+                    {"player": 2, "score": 40, "timestamp": "2023-10-25T12:00:05Z"},
+                ],
+            )
+        ],
+    )
+    def post(self, request) -> Response:
+        if not isinstance(request.data, list):
+            raise ValidationError("Ожидается список событий")
+
+        if len(request.data) > settings.SCORE_EVENTS_MAX_BATCH:
+            raise ValidationError(
+                f"Не более {settings.SCORE_EVENTS_MAX_BATCH} событий в запросе"
+            )
+
+        serializer = ScoreEventSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        minigames = dict(Minigame.objects.values_list("name", "id"))
+        events = []
+        for event in serializer.validated_data:
+            minigame = event.get("minigame")
+            if minigame is not None and minigame not in minigames:
+                raise ValidationError(f"Неизвестная мини-игра: {minigame}")
+
+            events.append(
+                ScoreEvent(
+                    player_id=event["player"],
+                    minigame_id=minigames.get(minigame),
+                    score=event["score"],
+                    created_at=event["timestamp"],
+                )
+            )
+
+        ScoreEvent.objects.bulk_create(events)
+        return Response({"accepted": len(events)}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,109 @@
+from django.db import connection, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from rest_framework.exceptions import ValidationError
+
+from .histogram import record_score_change
+from .models import Player
+
+WALLET_FIELDS = ("own_money", "own_coins", "credit")
+# Диапазон IntegerField (int4 в PostgreSQL), в него должны попадать и изменения,
+# и новые значения кошелька
+WALLET_MIN, WALLET_MAX = BaseDatabaseOperations.integer_field_ranges["IntegerField"]
+RETURNING_FIELDS = ("id", *WALLET_FIELDS, "top_score", "version")
+
+
+def apply_wallet_delta(player_id, deltas):
+    """
+    Атомарно прибавляет значения к полям кошелька одним запросом
+    UPDATE ... RETURNING, без предварительного чтения игрока. При изменении
+    own_coins top_score поднимается до нового значения own_coins.
+    Возвращает новые значения полей или None, если игрок не найден. Если
+    новое значение вышло бы за пределы WALLET_MIN..WALLET_MAX, игрок не
+    меняется и выбрасывается ValidationError.
+
+    Прежний top_score нужен гистограмме счёта. В PostgreSQL его возвращает
+    тот же запрос (CTE с FOR UPDATE), в SQLite RETURNING видит только новые
+    значения, поэтому там он читается в той же транзакции перед UPDATE.
+    """
+    qn = connection.ops.quote_name
+    # В SQLite скалярный MAX с несколькими аргументами - аналог GREATEST
+    greatest = "GREATEST" if connection.vendor == "postgresql" else "MAX"
+
+    assignments = []
+    params = []
+    conditions = []
+    bounds = []
+    for field, delta in deltas.items():
+        assignments.append(f"{qn(field)} = {qn(field)} + %s")
+        params.append(delta)
+        # Граница считается заранее: сумма в самом запросе переполнила бы
+        # int4 в PostgreSQL раньше, чем её можно было бы сравнить
+        if delta >= 0:
+            conditions.append(f"{qn(field)} <= %s")
+            bounds.append(WALLET_MAX - delta)
+        else:
+            conditions.append(f"{qn(field)} >= %s")
+            bounds.append(WALLET_MIN - delta)
+
+    if "own_coins" in deltas:
+        assignments.append(
+            f"{qn('top_score')} = {greatest}({qn('top_score')}, {qn('own_coins')} + %s)"
+        )
+        params.append(deltas["own_coins"])
+
+    # Новая версия игрока, см. Player.version_changes
+    for field in ("version", "wallet_version"):
+        assignments.append(f"{qn(field)} = {qn('version')} + 1")
+
+    table = qn(Player._meta.db_table)
+    returning = ", ".join(qn(field) for field in RETURNING_FIELDS)
+    where = " AND ".join([f"{qn('id')} = %s", *conditions])
+    sql = (
+        f"UPDATE {table} SET {', '.join(assignments)} WHERE {where} "
+        f"RETURNING {returning}"
+    )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"WITH old AS (SELECT {qn('top_score')} FROM {table} "
+                f"WHERE {qn('id')} = %s FOR UPDATE) "
+                f"{sql}, (SELECT {qn('top_score')} FROM old)",
+                [player_id, *params, player_id, *bounds],
+            )
+            row = cursor.fetchone()
+        else:
+            cursor.execute(
+                f"SELECT {qn('top_score')} FROM {table} WHERE {qn('id')} = %s",
+                [player_id],
+            )
+            old = cursor.fetchone()
+            cursor.execute(sql, [*params, player_id, *bounds])
+            row = cursor.fetchone()
+            if row:
+                row = (*row, old[0])
+
+    if not row:
+        return check_wallet_range(player_id, deltas)
+
+    *values, old_top_score = row
+    changed = dict(zip(RETURNING_FIELDS, values))
+    record_score_change(old_top_score, changed["top_score"])
+    return changed
+
+
+def check_wallet_range(player_id, deltas):
+    """
+    Причина, по которой apply_wallet_delta не изменил игрока: None, если
+    игрока нет, иначе ValidationError с полями, вышедшими бы за диапазон.
+    """
+    current = Player.objects.filter(pk=player_id).values(*deltas).first()
+    if current is None:
+        return None
+    raise ValidationError(
+        {
+            field: [f"Значение должно оставаться в пределах {WALLET_MIN}..{WALLET_MAX}"]
+            for field, delta in deltas.items()
+            if not WALLET_MIN <= current[field] + delta <= WALLET_MAX
+        }
+    )
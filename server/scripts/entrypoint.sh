@@ -6,12 +6,14 @@ LOG_LEVEL=${LOG_LEVEL:-info}
 LOG_CONFIG=${LOG_CONFIG:-/app/server/logging.ini}
 
 export WORKER_CLASS=${WORKER_CLASS:-"uvicorn.workers.UvicornWorker"}
-export APP_MODULE=${APP_MODULE:-"server.wsgi:application"}
+export APP_MODULE=${APP_MODULE:-"server.asgi:application"}
 
 sleep 10
 
 /app/server/scripts/migrations.sh
 /app/server/scripts/createsuperuser.sh
 /app/server/scripts/loaddata.sh
+/app/server/scripts/rebuildhistogram.sh
+/app/server/scripts/buildschema.sh
 
-/opt/venv/bin/gunicorn --worker-tmp-dir /dev/shm --bind "${APP_HOST}:${APP_PORT}" --log-config $LOG_CONFIG "$APP_MODULE"
+/opt/venv/bin/gunicorn --worker-tmp-dir /dev/shm -k "$WORKER_CLASS" --bind "${APP_HOST}:${APP_PORT}" --log-config $LOG_CONFIG "$APP_MODULE"
@@ -0,0 +1,3 @@
+#!/bin/bash
+
+/opt/venv/bin/python manage.py rebuildhistogram || true
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 application = get_asgi_application()
+
+# Импорт после инициализации Django
+from api.events import cancel_on_disconnect  # noqa: E402
+
+application = cancel_on_disconnect(application, "/api/v1/events/")
@@ -2,6 +2,7 @@ from os import getenv, path
 from pathlib import Path
 
 import dotenv
+from corsheaders.defaults import default_headers
 from django.core.management.utils import get_random_secret_key
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "corsheaders",
     "rest_framework",
     "drf_spectacular",
@@ -47,6 +49,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.middleware.LoadSheddingMiddleware",
+    "api.middleware.SQLiteWriterMiddleware",
+    "api.middleware.RequestProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "server.urls"
@@ -76,7 +81,8 @@ WSGI_APPLICATION = "server.wsgi.application"
 if DEVELOPMENT_MODE is True:
     DATABASES = {
         "default": {
-            "ENGINE": "django.db.backends.sqlite3",
+            # django.db.backends.sqlite3 с настройками SQLITE_PRAGMAS
+            "ENGINE": "api.sqlite",
             "NAME": BASE_DIR / "sql_db/db.sqlite3",
         }
     }
@@ -93,6 +99,128 @@ else:
     }
 
 
+# Реплики только для чтения: хосты PostgreSQL или, в DEVELOPMENT_MODE,
+# имена файлов SQLite в каталоге sql_db, через запятую
+REPLICA_DATABASES = []
+for index, replica in enumerate(
+    filter(None, getenv("DATABASE_REPLICAS", "").split(",")), start=1
+):
+    alias = f"replica_{index}"
+    if DEVELOPMENT_MODE is True:
+        DATABASES[alias] = {
+            **DATABASES["default"],
+            "NAME": BASE_DIR / "sql_db" / replica,
+        }
+    else:
+        DATABASES[alias] = {**DATABASES["default"], "HOST": replica}
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["api.db_routers.ReplicaRouter"]
+
+# Режим SQLite для DEVELOPMENT_MODE и небольших установок: PRAGMA новых
+# соединений и транзакции BEGIN IMMEDIATE (бэкенд api.sqlite), выполнение
+# пишущих запросов по одному (api.middleware.SQLiteWriterMiddleware).
+# Время ожидания блокировки в мс
+SQLITE_TUNING = getenv("SQLITE_TUNING", "True") == "True"
+SQLITE_SERIALIZE_WRITES = getenv("SQLITE_SERIALIZE_WRITES", "True") == "True"
+SQLITE_BUSY_TIMEOUT = int(getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ, а не в страницах
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Сколько секунд после изменения игрок читается только с основной БД
+REPLICA_STICKY_SECONDS = int(getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# Количество воркеров gunicorn (читает ту же переменную окружения). При
+# нескольких процессах кэш документов игроков, блокировки Idempotency-Key,
+# корзины троттлинга и окна прилипания к основной БД должны храниться в общем
+# бэкенде (Redis или Memcached), иначе приложение не запустится
+# (api.shared_state)
+WEB_CONCURRENCY = int(getenv("WEB_CONCURRENCY", "1"))
+
+CACHES = {
+    "default": {
+        "BACKEND": getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Рассылка событий для /api/v1/events/: в пределах процесса или между
+# процессами через LISTEN/NOTIFY (api.events.PostgresBroker)
+EVENT_BROKER = getenv("EVENT_BROKER", "api.events.InProcessBroker")
+EVENTS_PG_CHANNEL = "game_events"
+# Сколько событий может ждать медленного клиента до закрытия потока
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT = 15
+EVENTS_RETRY_MS = 3000
+# Пересчёт таблицы лидеров для подписчиков не чаще раза в интервал, секунды
+LEADERBOARD_PUSH_INTERVAL = float(getenv("LEADERBOARD_PUSH_INTERVAL", "1"))
+LEADERBOARD_PUSH_SIZE = 100
+
+# Профилировщик для сотрудников (api.profiling): предельная длительность
+# сэмплирования в секундах и количество хранимых отчётов по запросам
+PROFILER_MAX_SECONDS = 30
+PROFILER_KEEP_REPORTS = 50
+
+# Журнал запросов к БД (api.querylog): порог медленного запроса в мс, доля
+# медленных SELECT, для которых снимается план в PostgreSQL (EXPLAIN ANALYZE
+# только для запросов без побочных эффектов), количество хранимых медленных
+# запросов и нормализованных текстов
+SLOW_QUERY_MS = float(getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAIN_RATE = float(getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+QUERYLOG_KEEP_SLOW = 100
+QUERYLOG_MAX_FINGERPRINTS = 1000
+
+# Кэш сериализованных документов игроков (api.player_cache)
+PLAYER_CACHE_ALIAS = "default"
+PLAYER_CACHE_TIMEOUT = int(getenv("PLAYER_CACHE_TIMEOUT", "300"))
+
+# Таблицы лидеров мини-игр: сколько игроков с большим счётом считается
+# точно, дальше место оценивается по гистограмме, которую задача
+# rebuild_minigame_histograms пересчитывает раз в MINIGAME_HISTOGRAM_INTERVAL
+# секунд
+MINIGAME_EXACT_RANK_LIMIT = 10000
+MINIGAME_HISTOGRAM_INTERVAL = int(getenv("MINIGAME_HISTOGRAM_INTERVAL", "300"))
+
+# Рост урожая на сервере (api.growth): множитель прироста генно-
+# модифицированного урожая и прибавка к множителю за купленное оборудование
+HARVEST_GEN_MODIFIED_MULTIPLIER = float(getenv("HARVEST_GEN_MODIFIED_MULTIPLIER", "2"))
+HARVEST_EQUIPMENT_BONUS = {"software": 0.1, "bpla": 0.25, "robot": 0.5}
+
+# Повторы изменяющих запросов к /api/v1/player/ с одним Idempotency-Key
+# получают сохранённый ответ в течение IDEMPOTENCY_TTL секунд. При нескольких
+# процессах нужен общий кэш
+IDEMPOTENCY_CACHE_ALIAS = "default"
+IDEMPOTENCY_TTL = int(getenv("IDEMPOTENCY_TTL", "86400"))
+# Сколько секунд повтор ждёт завершения выполняющегося запроса
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+# Архив неактивных игроков (api.archive): не чаще чем раз в интервал,
+# секунды, обращение игрока обновляет Player.last_active; игроки без
+# обращений больше ARCHIVE_INACTIVE_DAYS дней переносятся в архив
+PLAYER_ACTIVITY_INTERVAL = int(getenv("PLAYER_ACTIVITY_INTERVAL", "3600"))
+ARCHIVE_INACTIVE_DAYS = int(getenv("ARCHIVE_INACTIVE_DAYS", "90"))
+
+# Аренда фоновой задачи (api.jobs), секунды: воркер продлевает её, пока
+# задача выполняется, задачу с истёкшей арендой забирает другой воркер
+JOB_LEASE_SECONDS = int(getenv("JOB_LEASE_SECONDS", "300"))
+
+# Начиная с этого количества игроков админка показывает оценку
+# количества строк PostgreSQL вместо точного COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(
+    getenv("ADMIN_ESTIMATED_COUNT_THRESHOLD", "100000")
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -143,8 +271,36 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # MessagePack выбирается клиентом через Accept/Content-Type (api.renderers)
+    "DEFAULT_RENDERER_CLASSES": (
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "api.renderers.MessagePackRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+        "api.renderers.MessagePackParser",
+    ),
+    # Маркерные корзины для пишущих запросов (api.throttling)
+    "DEFAULT_THROTTLE_RATES": {
+        "player_write": getenv("THROTTLE_PLAYER_WRITE", "60/min"),
+        "ip_write": getenv("THROTTLE_IP_WRITE", "600/min"),
+    },
 }
 
+# Хранилище корзин: в памяти процесса или общее через кэш Django
+# (api.throttling.CacheBucketStore)
+THROTTLE_BUCKET_STORE = getenv(
+    "THROTTLE_BUCKET_STORE", "api.throttling.MemoryBucketStore"
+)
+THROTTLE_CACHE_ALIAS = "default"
+
+# Максимум одновременных пишущих запросов к API на процесс, 0 - без ограничения
+LOAD_SHEDDING_MAX_INFLIGHT = int(getenv("LOAD_SHEDDING_MAX_INFLIGHT", "32"))
+LOAD_SHEDDING_RETRY_AFTER = 1
+
 SPECTACULAR_SETTINGS = {
     "SWAGGER_UI_DIST": "SIDECAR",
     "SWAGGER_UI_FAVICON_HREF": "SIDECAR",
@@ -158,7 +314,6 @@ SPECTACULAR_SETTINGS = {
     "SHOW_RESPONSE_BODY": True,
     "DEFAULT_MODEL_DEPTH": None,
     "SERVE_INCLUDE_SCHEMA": False,
-    "DISABLE_CACHE": True,
     "SCHEMA_PATH_PREFIX": "/api/v1",
     "TITLE": "Game API",
     "DESCRIPTION": "API игры для банка РСХБ, которую можно интегрировать в API на сайте банка. Цель игры - увеличить осведомленность пользователей о современных технологиях в сельском хозяйстве и вызвать у них интерес к участию в этой области.",
@@ -192,6 +347,12 @@ SPECTACULAR_SETTINGS = {
     ],
 }
 
+# Максимальное количество событий счёта в одном запросе
+SCORE_EVENTS_MAX_BATCH = int(getenv("SCORE_EVENTS_MAX_BATCH", "1000"))
+
+# Каталог собранных схем OpenAPI (manage.py buildschema или первый запрос)
+SCHEMA_CACHE_DIR = BASE_DIR / "schema"
+
 # Domain names
 DOMAIN = getenv("DOMAIN")
 SITE_NAME = "Game"
@@ -200,3 +361,4 @@ CORS_ALLOWED_ORIGINS = getenv(
     "CORS_ALLOWED_ORIGINS", "http://127.0.0.1:8000,http://localhost:8000"
 ).split(",")
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
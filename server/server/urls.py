@@ -1,21 +1,42 @@
 import api.urls
+from api.schema import CachedSchemaView
+from api.views.debug import (
+    QueryLogView,
+    RequestProfileDetailView,
+    RequestProfileListView,
+    SamplingProfileView,
+)
+from api.views.events import EventStreamView
 from api.views.liderboard import PlayerStatistics
+from api.views.metrics import MetricsView
+from api.views.scores import ScoreEventIngestView
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("api/schema/", CachedSchemaView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="docs"),
     path("api/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
     path("api/v1/stats/", PlayerStatistics.as_view(), name="statistics"),
+    path("api/v1/metrics/", MetricsView.as_view(), name="metrics"),
+    path("api/v1/events/", EventStreamView.as_view(), name="events"),
+    path("api/v1/debug/profile/", SamplingProfileView.as_view(), name="profile"),
+    path("api/v1/debug/queries/", QueryLogView.as_view(), name="query-log"),
+    path(
+        "api/v1/debug/profiles/",
+        RequestProfileListView.as_view(),
+        name="request-profiles",
+    ),
+    path(
+        "api/v1/debug/profiles/<str:profile_id>/",
+        RequestProfileDetailView.as_view(),
+        name="request-profile",
+    ),
+    path("api/v1/score/events/", ScoreEventIngestView.as_view(), name="score-events"),
 ]
 
 urlpatterns += api.urls.router.urls